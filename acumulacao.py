@@ -0,0 +1,97 @@
+# Bibliotecas ----
+
+import numpy as np
+import pandas as pd
+
+
+# Funções ----
+
+# Função para converter variações percentuais em logaritmos dos fatores (1 + x/100)
+def _log_fatores(serie):
+  return np.log1p(serie.to_numpy(dtype = "float64") / 100)
+
+# Função para obter o número (ordinal) do mês de cada data do índice
+def _ordinal_mes(indice):
+  if not isinstance(indice, pd.DatetimeIndex):
+    raise ValueError("A série deve ter índice de datas")
+  return indice.year.to_numpy() * 12 + indice.month.to_numpy() - 1
+
+# Função para acumular uma série de variações mensais (%) em janelas móveis de
+# n meses: soma móvel dos logaritmos a partir da soma acumulada
+def acumular_em_janela(serie, janela = 12):
+  logs = _log_fatores(serie)
+  faltantes = np.isnan(logs)
+  soma = np.concatenate([[0], np.cumsum(np.where(faltantes, 0, logs))])
+  contagem = np.concatenate([[0], np.cumsum(faltantes)])
+
+  resultado = np.full(logs.shape[0], np.nan)
+  if logs.shape[0] >= janela:
+    soma_janela = soma[janela:] - soma[:-janela]
+    # Janelas com algum valor ausente ficam ausentes
+    valida = contagem[janela:] == contagem[:-janela]
+    # Com índice de datas, a janela também precisa cobrir n meses consecutivos
+    if isinstance(serie.index, pd.DatetimeIndex):
+      meses = _ordinal_mes(serie.index)
+      valida &= meses[janela - 1:] - meses[:meses.shape[0] - janela + 1] == janela - 1
+    resultado[janela - 1:] = np.where(valida, np.expm1(soma_janela) * 100, np.nan)
+
+  return pd.Series(resultado, index = serie.index, name = serie.name)
+
+# Função para acumular uma série de variações mensais (%) em 12 meses
+def acumular_12m(serie):
+  return acumular_em_janela(serie, janela = 12)
+
+# Função para acumular uma série de variações mensais (%) desde o início de cada
+# período do calendário ("Y" para o ano, "Q" para o trimestre)
+def acumular_no_periodo(serie, periodo):
+  meses = _ordinal_mes(serie.index)
+  if periodo == "Y":
+    tamanho = 12
+  elif periodo == "Q":
+    tamanho = 3
+  else:
+    raise ValueError("Período inválido")
+
+  logs = pd.Series(_log_fatores(serie), index = serie.index)
+  grupos = meses // tamanho
+  soma = logs.groupby(grupos).cumsum().to_numpy()
+  # O acumulado só é conhecido se todos os meses do período até a data
+  # estiverem presentes (sem valores ausentes nem meses faltando no índice)
+  observados = logs.notna().groupby(grupos).cumsum().to_numpy()
+  valida = logs.notna().to_numpy() & (observados == meses % tamanho + 1)
+
+  resultado = np.where(valida, np.expm1(soma) * 100, np.nan)
+  return pd.Series(resultado, index = serie.index, name = serie.name)
+
+# Função para acumular uma série de variações mensais (%) no ano
+def acumular_no_ano(serie):
+  return acumular_no_periodo(serie, "Y")
+
+# Função para acumular uma série de variações mensais (%) no trimestre
+def acumular_no_trimestre(serie):
+  return acumular_no_periodo(serie, "Q")
+
+
+# Benchmark ----
+
+if __name__ == "__main__":
+  from armazenamento import ler_painel
+  from utils import medir
+
+  # Caminho anterior: função Python chamada uma vez por linha
+  def acumular_rolling_apply(serie):
+    return ((((serie / 100) + 1).rolling(12).apply(lambda x: np.prod(x), raw = True) - 1)) * 100
+
+  ipca = ler_painel("dados/df_mensal.parquet", colunas = ["ipca"]).ipca.dropna().asfreq("MS")
+  longa = pd.Series(
+    np.random.default_rng(1984).normal(0.5, 0.4, 12 * 1000),
+    index = pd.date_range("1000-01-01", periods = 12 * 1000, freq = "MS", unit = "s")
+    )
+
+  for nome, serie in [(f"IPCA ({ipca.shape[0]} meses)", ipca), (f"Sintética ({longa.shape[0]} meses)", longa)]:
+    diferenca = (acumular_12m(serie) - acumular_rolling_apply(serie)).abs().max()
+    print(f"{nome}: diferença máxima {diferenca:.2e} p.p.")
+    print(f"  rolling().apply:         {medir(lambda: acumular_rolling_apply(serie)):.2f} ms")
+    print(f"  acumular_12m:            {medir(lambda: acumular_12m(serie)):.2f} ms")
+    print(f"  acumular_no_ano:         {medir(lambda: acumular_no_ano(serie)):.2f} ms")
+    print(f"  acumular_no_trimestre:   {medir(lambda: acumular_no_trimestre(serie)):.2f} ms")
@@ -0,0 +1,91 @@
+# Bibliotecas ----
+
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from utils import gravar_atomico
+
+
+# Parâmetros ----
+
+# Linhas por grupo de linhas (row group) dos painéis: cada grupo cobre um
+# intervalo contíguo de datas, com estatísticas mín./máx. usadas nos filtros
+LINHAS_POR_GRUPO = {
+  "df_mensal.parquet": 12 * 20,
+  "df_diaria.parquet": 366 * 10
+}
+LINHAS_POR_GRUPO_PADRAO = 10000
+
+
+# Funções ----
+
+# Função para salvar um painel (índice de datas) em parquet, de forma atômica
+def salvar_painel(df, caminho):
+  # O índice é gravado como a coluna "data", ordenada, para que filtros de
+  # data descartem grupos de linhas inteiros pelas estatísticas
+  tabela = pa.Table.from_pandas(df.sort_index().rename_axis("data"), preserve_index = True)
+  def gravar(temporario):
+    pq.write_table(
+      tabela,
+      temporario,
+      row_group_size = LINHAS_POR_GRUPO.get(os.path.basename(caminho), LINHAS_POR_GRUPO_PADRAO),
+      compression = "zstd",
+      write_statistics = True
+      )
+  gravar_atomico(caminho, gravar)
+
+# Função para ler um painel lendo apenas as colunas e o intervalo de datas pedidos
+def ler_painel(caminho, colunas = None, inicio = None, fim = None):
+  arquivo = pq.ParquetFile(caminho, memory_map = True)
+  # Painéis antigos guardam o índice sem nome
+  indice = arquivo.schema_arrow.pandas_metadata["index_columns"]
+  coluna_data = indice[0] if indice and isinstance(indice[0], str) else "data"
+  inicio = None if inicio is None else pd.Timestamp(inicio)
+  fim = None if fim is None else pd.Timestamp(fim)
+
+  # Descarta grupos de linhas fora do intervalo pelas estatísticas da coluna de datas
+  posicao = arquivo.schema_arrow.get_field_index(coluna_data)
+  grupos = []
+  for i in range(arquivo.num_row_groups):
+    estatisticas = arquivo.metadata.row_group(i).column(posicao).statistics
+    if estatisticas is not None and estatisticas.has_min_max:
+      if inicio is not None and pd.Timestamp(estatisticas.max) < inicio:
+        continue
+      if fim is not None and pd.Timestamp(estatisticas.min) > fim:
+        continue
+    grupos.append(i)
+
+  df = (
+    arquivo
+    .read_row_groups(grupos, columns = None if colunas is None else list(colunas) + [coluna_data])
+    .to_pandas()
+    .rename_axis("data")
+  )
+  if inicio is not None:
+    df = df[df.index >= inicio]
+  if fim is not None:
+    df = df[df.index <= fim]
+  return df
+
+
+# Benchmark ----
+
+if __name__ == "__main__":
+  import tempfile
+  from utils import medir
+
+  pasta = "dados/"
+  repeticoes = 50
+
+  with tempfile.TemporaryDirectory() as temporaria:
+    for arquivo, colunas in [("df_mensal.parquet", ["ipca"]), ("df_diaria.parquet", ["selic"])]:
+      original = pasta + arquivo
+      novo = os.path.join(temporaria, arquivo)
+      salvar_painel(pd.read_parquet(original), novo)
+      inicio = pd.read_parquet(original).index.max() - pd.DateOffset(years = 15)
+
+      print(f"{arquivo}: {os.path.getsize(original) / 1024:.0f} KB -> {os.path.getsize(novo) / 1024:.0f} KB")
+      print(f"  leitura completa + filtro:     {medir(lambda: pd.read_parquet(original).filter(colunas), repeticoes):.2f} ms")
+      print(f"  ler_painel (colunas):          {medir(lambda: ler_painel(novo, colunas), repeticoes):.2f} ms")
+      print(f"  ler_painel (colunas + datas):  {medir(lambda: ler_painel(novo, colunas, inicio = inicio), repeticoes):.2f} ms")
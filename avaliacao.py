@@ -0,0 +1,201 @@
+# Bibliotecas ----
+
+import itertools
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sklearn.base import clone
+from sklearn.linear_model import Ridge, HuberRegressor, LinearRegression
+from skforecast.ForecasterAutoreg import ForecasterAutoreg
+from execucao import MAX_PROCESSOS, CONTEXTO
+from preparacao import VARIAVEIS_X, dummies_sazonais, ajustar_transformacoes, aplicar_transformacoes, reverter_y
+from utils import gravar_atomico
+
+
+# Parâmetros ----
+
+# Tabela com as previsões pseudo fora da amostra de cada candidato, origem e horizonte
+ARQUIVO_AVALIACAO = "dados/avaliacao_modelos.parquet"
+
+# Horizonte máximo (meses) e número de origens (últimos meses da amostra)
+HORIZONTE = 12
+ORIGENS = 48
+
+# Espaço de candidatos: regressor, lags, transformação (de y e dos regressores)
+# e subconjunto dos regressores (as dummies sazonais entram sempre)
+REGRESSORES = {
+  "Ridge": Ridge(random_state = 1984),
+  "Huber": HuberRegressor(),
+  "MQO": LinearRegression()
+}
+LAGS = [1, 2]
+TRANSFORMACOES = ["yeo-johnson", "nenhuma"]
+
+# Esquema da tabela: textos repetidos codificados como dicionário
+ESQUEMA = pa.schema([
+  ("candidato", pa.dictionary(pa.int16(), pa.string())),
+  ("regressor", pa.dictionary(pa.int8(), pa.string())),
+  ("lags", pa.int8()),
+  ("transformacao", pa.dictionary(pa.int8(), pa.string())),
+  ("variaveis", pa.dictionary(pa.int16(), pa.string())),
+  ("origem", pa.timestamp("ns")),
+  ("horizonte", pa.int8()),
+  ("data_referencia", pa.timestamp("ns")),
+  ("previsao", pa.float32()),
+  ("observado", pa.float32())
+])
+
+
+# Funções ----
+
+# Função para listar os candidatos: todas as combinações de regressor, lags,
+# transformação e subconjunto dos regressores
+def candidatos(regressores = REGRESSORES, lags = LAGS, transformacoes = TRANSFORMACOES,
+               variaveis_x = VARIAVEIS_X):
+  subconjuntos = [
+    list(combinacao)
+    for tamanho in range(len(variaveis_x) + 1)
+    for combinacao in itertools.combinations(variaveis_x, tamanho)
+  ]
+  lista = []
+  for regressor, lag, transformacao, variaveis in itertools.product(regressores, lags, transformacoes, subconjuntos):
+    lista.append({
+      "candidato": f"{regressor} | lags={lag} | {transformacao} | {'+'.join(variaveis) or 'sem regressores'}",
+      "regressor": regressor,
+      "lags": lag,
+      "transformacao": transformacao,
+      "variaveis": "+".join(variaveis),
+      "colunas": variaveis
+    })
+  return lista
+
+# Função para avaliar todos os candidatos em uma origem (executada em um processo
+# filho): treina com os dados até a origem e prevê os meses seguintes com os
+# regressores observados. As transformações Yeo-Johnson de y e de x da origem
+# vêm de preparacao.py (ajustadas uma única vez por versão dos dados e
+# guardadas em disco) e são compartilhadas por todos os candidatos (ajustadas
+# coluna a coluna, equivalem a usar transformer_y e transformer_exog em cada um)
+def _avaliar_origem(origem, lista, y, x, horizonte, regressores):
+  y_treino = y[y.index <= origem]
+  futuro = y.index[y.index > origem][:horizonte]
+  x_treino, x_futuro = x.loc[y_treino.index], x.loc[futuro]
+  sazonais = dummies_sazonais(y_treino.index).columns.to_list()
+
+  transformacoes = ajustar_transformacoes(y_treino, x_treino)
+  dados = {
+    "nenhuma": (y_treino, x_treino, x_futuro),
+    "yeo-johnson": (
+      *aplicar_transformacoes(transformacoes, y_treino, x_treino),
+      aplicar_transformacoes(transformacoes, exog = x_futuro)[1]
+    )
+  }
+
+  resultados = []
+  with warnings.catch_warnings():
+    warnings.simplefilter("ignore")
+    for candidato in lista:
+      y_c, x_treino_c, x_futuro_c = dados[candidato["transformacao"]]
+      colunas = candidato["colunas"] + sazonais
+      modelo = ForecasterAutoreg(regressor = clone(regressores[candidato["regressor"]]), lags = candidato["lags"])
+      modelo.fit(y_c, x_treino_c[colunas], store_in_sample_residuals = False)
+      previsao = modelo.predict(steps = len(futuro), exog = x_futuro_c[colunas]).to_numpy()
+      if candidato["transformacao"] == "yeo-johnson":
+        previsao = reverter_y(transformacoes, previsao)
+      resultados.append(previsao)
+
+  return pd.DataFrame({
+    "candidato": np.repeat([c["candidato"] for c in lista], len(futuro)),
+    "origem": origem,
+    "horizonte": np.tile(np.arange(1, len(futuro) + 1), len(lista)),
+    "data_referencia": np.tile(futuro, len(lista)),
+    "previsao": np.concatenate(resultados),
+    "observado": np.tile(y.loc[futuro].to_numpy(), len(lista))
+  })
+
+# Função para avaliar os candidatos por origem móvel (rolling origin): cada uma
+# das últimas `origens` datas da amostra é uma origem, avaliada em um processo
+def avaliar_candidatos(y, x, lista = None, horizonte = HORIZONTE, origens = ORIGENS,
+                       regressores = REGRESSORES, max_processos = MAX_PROCESSOS):
+  # Candidatos com regressores descartados na preparação (NAs demais) ficam de fora
+  lista = [c for c in lista or candidatos(regressores) if set(c["colunas"]) <= set(x.columns)]
+  datas_origem = y.index[-origens - 1:-1]
+
+  with ProcessPoolExecutor(max_workers = min(max_processos, len(datas_origem)), mp_context = CONTEXTO) as executor:
+    futuros = [
+      executor.submit(_avaliar_origem, origem, lista, y, x, horizonte, regressores)
+      for origem in datas_origem
+    ]
+    resultado = pd.concat([futuro.result() for futuro in futuros], ignore_index = True)
+
+  atributos = pd.DataFrame(lista).drop(columns = "colunas")
+  return resultado.merge(atributos, on = "candidato", how = "left")[ESQUEMA.names]
+
+# Função para gravar a tabela da avaliação (gravação atômica)
+def salvar_avaliacao(df, caminho = ARQUIVO_AVALIACAO):
+  tabela = pa.Table.from_pandas(df, schema = ESQUEMA, preserve_index = False)
+  gravar_atomico(caminho, lambda temporario: pq.write_table(tabela, temporario, compression = "zstd"))
+
+# Função para ler a tabela da avaliação
+def ler_avaliacao(caminho = ARQUIVO_AVALIACAO):
+  return pd.read_parquet(caminho)
+
+# Função para resumir a avaliação: viés, MAE e RMSE por candidato e horizonte,
+# e o ranking dos candidatos pelo RMSE médio entre os horizontes
+def resumir_avaliacao(df):
+  por_horizonte = (
+    df
+    .assign(erro = lambda x: x.observado - x.previsao)
+    .groupby(["candidato", "horizonte"], observed = True)
+    .erro
+    .agg(
+      n = "count",
+      vies = "mean",
+      mae = lambda e: e.abs().mean(),
+      rmse = lambda e: np.sqrt((e ** 2).mean())
+      )
+    .reset_index()
+  )
+  ranking = (
+    por_horizonte
+    .groupby("candidato", observed = True)
+    .agg(rmse_medio = ("rmse", "mean"), mae_medio = ("mae", "mean"), vies_medio = ("vies", "mean"))
+    .sort_values("rmse_medio")
+    .reset_index()
+  )
+  return por_horizonte, ranking
+
+
+# Seleção de modelos ----
+
+if __name__ == "__main__":
+  import argparse
+  import time
+  from metadados import transformacoes
+  from preparacao import preparar_dados
+
+  parser = argparse.ArgumentParser(description = "Avalia modelos candidatos por origem móvel (backtesting)")
+  parser.add_argument("--origens", type = int, default = ORIGENS, help = "número de origens (últimos meses da amostra)")
+  parser.add_argument("--horizonte", type = int, default = HORIZONTE, help = "horizonte máximo (meses)")
+  parser.add_argument("--processos", type = int, default = MAX_PROCESSOS, help = "máximo de processos simultâneos")
+  parser.add_argument("--top", type = int, default = 15, help = "número de candidatos exibidos no ranking")
+  argumentos = parser.parse_args()
+
+  y, x = preparar_dados(transformacoes())
+  lista = candidatos()
+
+  inicio = time.perf_counter()
+  df = avaliar_candidatos(
+    y, x, lista,
+    horizonte = argumentos.horizonte,
+    origens = argumentos.origens,
+    max_processos = argumentos.processos
+    )
+  salvar_avaliacao(df)
+  print(f"{len(lista)} candidatos x {argumentos.origens} origens avaliados em {time.perf_counter() - inicio:.1f} s ({ARQUIVO_AVALIACAO})")
+
+  _, ranking = resumir_avaliacao(df)
+  with pd.option_context("display.width", 200, "display.max_colwidth", 120):
+    print(ranking.head(argumentos.top).round(3))
@@ -0,0 +1,159 @@
+# Bibliotecas ----
+
+import glob
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+import pandas as pd
+from transporte import requisitar
+# utils também usa obter_tabela daqui: importa o módulo, e não os nomes
+import utils
+
+
+# Parâmetros ----
+
+# Pasta do cache de respostas HTTP
+PASTA_CACHE = "cache/http/"
+
+# Tamanho máximo do cache em disco (bytes); acima disso, remove as entradas
+# acessadas há mais tempo (LRU)
+TAMANHO_MAXIMO = 1024 ** 3
+
+# Tempo (em segundos) durante o qual uma resposta é reutilizada sem sequer
+# consultar o servidor; depois disso, é revalidada com ETag/Last-Modified
+TTL_POR_FONTE = {
+  "api.bcb.gov.br": 6 * 3600,
+  "olinda.bcb.gov.br": 6 * 3600,
+  "apisidra.ibge.gov.br": 6 * 3600,
+  "www.ipeadata.gov.br": 12 * 3600,
+  "fred.stlouisfed.org": 6 * 3600
+}
+TTL_PADRAO = 0
+
+_trava_limpeza = threading.Lock()
+
+
+# Exceções ----
+
+# Resposta recebida, mas que o leitor não conseguiu transformar em tabela
+class ErroLeitura(ValueError):
+  pass
+
+
+# Funções ----
+
+# Função para gerar a chave de cache de um texto
+def _chave(texto):
+  return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+# Função para ler os metadados de uma entrada do cache
+def _ler_metadados(base):
+  try:
+    with open(base + ".json", encoding = "utf-8") as arquivo:
+      return json.load(arquivo)
+  except (OSError, ValueError):
+    return None
+
+# Função para gravar os metadados de uma entrada do cache
+def _gravar_metadados(base, metadados):
+  utils.gravar_json(base + ".json", metadados)
+
+# Função para fazer a requisição HTTP, condicional se houver validadores
+def _requisitar(url, metadados):
+  cabecalhos = {}
+  if metadados is not None:
+    if metadados.get("etag"):
+      cabecalhos["If-None-Match"] = metadados["etag"]
+    if metadados.get("last_modified"):
+      cabecalhos["If-Modified-Since"] = metadados["last_modified"]
+  return requisitar(url, cabecalhos)
+
+# Função para remover as entradas menos usadas quando o cache excede o limite
+# (os metadados são regravados a cada acesso: sua data de modificação marca o
+# último uso de cada entrada)
+def limpar_cache(tamanho_maximo = TAMANHO_MAXIMO):
+  with _trava_limpeza:
+    entradas = []
+    for caminho_metadados in glob.glob(PASTA_CACHE + "*.json"):
+      base = caminho_metadados[:-len(".json")]
+      entradas.append([caminho_metadados, base + ".bin"] + glob.glob(base + "-*.pkl"))
+    utils.limpar_lru(entradas, tamanho_maximo, por_tamanho = True)
+
+# Função para remover uma entrada do cache (resposta, metadados e tabelas lidas)
+def _remover_entrada(base):
+  for arquivo in [base + ".json", base + ".bin"] + glob.glob(base + "-*.pkl"):
+    if os.path.exists(arquivo):
+      os.remove(arquivo)
+
+# Função para ler a tabela de uma resposta; uma resposta que não pode ser lida
+# (por exemplo, uma página de erro em HTML) vira ErroLeitura
+def _ler(leitor, conteudo, *args, **kwargs):
+  try:
+    return leitor(io.BytesIO(conteudo), *args, **kwargs)
+  except Exception as e:
+    raise ErroLeitura(f"Resposta ilegível: {e}") from e
+
+# Função para obter uma tabela a partir de uma URL, usando o cache em disco. A
+# resposta e os metadados só são gravados depois que a tabela é lida com
+# sucesso; `forcar` ignora o TTL (usado nas retentativas após ErroLeitura)
+def obter_tabela(url, leitor, *args, forcar = False, **kwargs):
+  os.makedirs(PASTA_CACHE, exist_ok = True)
+  base = PASTA_CACHE + _chave(url)
+  # A tabela já lida é guardada por combinação de URL e argumentos do leitor
+  caminho_tabela = f"{base}-{_chave(leitor.__name__ + repr(args) + repr(sorted(kwargs.items())))[:16]}.pkl"
+  metadados = _ler_metadados(base)
+  agora = time.time()
+
+  if metadados is not None and not os.path.exists(base + ".bin"):
+    metadados = None
+
+  ttl = TTL_POR_FONTE.get(urlsplit(url).netloc, TTL_PADRAO)
+  conteudo = None
+  if not forcar and metadados is not None and agora - metadados["validado"] < ttl:
+    modificado = False
+  else:
+    status, cabecalhos, conteudo = _requisitar(url, metadados)
+    resumo = (metadados or {}).get("hash")
+    if status != 304:
+      resumo = hashlib.sha256(conteudo).hexdigest()
+    # Fontes sem ETag/Last-Modified: conteúdo idêntico também conta como não modificado
+    modificado = status != 304 and resumo != (metadados or {}).get("hash")
+    metadados = {
+      "url": url,
+      "etag": cabecalhos.get("ETag", (metadados or {}).get("etag")),
+      "last_modified": cabecalhos.get("Last-Modified", (metadados or {}).get("last_modified")),
+      "hash": resumo,
+      "validado": agora
+    }
+
+  # Resposta não modificada: reaproveita a tabela lida anteriormente (regravar
+  # os metadados marca o último uso da entrada)
+  if not modificado and os.path.exists(caminho_tabela):
+    _gravar_metadados(base, metadados)
+    return pd.read_pickle(caminho_tabela)
+
+  if modificado:
+    df = _ler(leitor, conteudo, *args, **kwargs)
+    # Conteúdo novo e legível: descarta as tabelas lidas da versão anterior
+    for antiga in glob.glob(base + "-*.pkl"):
+      os.remove(antiga)
+    utils.gravar_bytes(base + ".bin", conteudo)
+  else:
+    with open(base + ".bin", "rb") as arquivo:
+      try:
+        df = _ler(leitor, arquivo.read(), *args, **kwargs)
+      except ErroLeitura:
+        # Resposta guardada ilegível: descarta a entrada para a próxima tentativa baixar de novo
+        _remover_entrada(base)
+        raise
+  _gravar_metadados(base, metadados)
+
+  utils.gravar_atomico(caminho_tabela, lambda caminho: df.to_pickle(caminho, compression = None))
+
+  if modificado:
+    limpar_cache()
+  return df
@@ -1,358 +1,446 @@
 # Bibliotecas ----
 
+import argparse
 import pandas as pd
-import numpy as np
 import os
+from datetime import date
 from utils import *
+from metadados import codigos_por_fonte
+from pipeline import executar_etapas
+from armazenamento import salvar_painel
+from tracking import atualizar_erros
+from visoes import salvar_inicializacao
+
+
+# Parâmetros ----
+
+# Modo de execução: incremental (padrão) ou reconstrução completa; etapas
+# específicas podem ser executadas isoladamente (com suas dependências)
+parser = argparse.ArgumentParser(description = "Atualiza a base de dados")
+parser.add_argument(
+    "--completo",
+    action = "store_true",
+    help = "reconstrói as tabelas coletando todo o histórico desde 01/01/2000"
+    )
+parser.add_argument(
+    "--etapa",
+    nargs = "+",
+    help = "executa apenas as etapas indicadas (ex.: coleta_fred tratamento_fred)"
+    )
+parser.add_argument(
+    "--forcar",
+    action = "store_true",
+    help = "ignora os artefatos intermediários e recalcula as etapas"
+    )
+argumentos = parser.parse_args()
 
+# DIGITAR O CAMINHO DA PASTA DRIVE PARA SALVAR TABELAS
+PASTA_DRIVE = "dados/"
+os.makedirs(PASTA_DRIVE, exist_ok = True)
 
-# Coleta de dados ----
+# No modo incremental, lê as tabelas armazenadas e calcula, por coluna, a
+# data de corte (início da janela de revisão) e a data de início da coleta
+incremental = (
+    not argumentos.completo
+    and os.path.exists(PASTA_DRIVE + "df_diaria.parquet")
+    and os.path.exists(PASTA_DRIVE + "df_mensal.parquet")
+)
+datas_corte = {}
+datas_inicio = {}
+if incremental:
+  df_diaria_atual = pd.read_parquet(PASTA_DRIVE + "df_diaria.parquet")
+  df_mensal_atual = pd.read_parquet(PASTA_DRIVE + "df_mensal.parquet")
+  ultimas_datas = pd.concat([
+      df_diaria_atual.apply(lambda x: x.last_valid_index()),
+      df_mensal_atual.apply(lambda x: x.last_valid_index())
+  ]).dropna().groupby(level = 0).max()
+  for id, ultima_data in ultimas_datas.items():
+    datas_corte[id], datas_inicio[id] = calcular_janela_incremental(ultima_data)
 
-# Importar metadados
-df_metadados = pd.read_excel(
-    io = "https://docs.google.com/spreadsheets/d/1NB1fkck-ol1y5fIETWDkoYG2sFhlgyKsADPfADK_98s/export?format=xlsx",
-    sheet_name = "Metadados"
-    )
+
+# Coleta de dados ----
 
 ### BCB/SGS
 
 # Filtra os códigos de API
-codigos_bcb_sgs = (
-    df_metadados
-    .query("Fonte == 'BCB/SGS'")
-    .reset_index(drop = True)[["Identificador", "Input de Coleta", "Frequência"]]
-)
+codigos_bcb_sgs = codigos_por_fonte("BCB/SGS")
 
 # Coleta dados do BCB/SGS
-df_bruto_bcb_sgs = {
-    "Diária": [],
-    "Mensal": [],
-    "Anual": []
-}
-for i in codigos_bcb_sgs.index:
-  i_corrente = codigos_bcb_sgs.iloc[i]
-  df_bruto_bcb_sgs[i_corrente["Frequência"]].append(
-      coleta_bcb_sgs(
-          codigo = i_corrente["Input de Coleta"],
-          id = i_corrente["Identificador"],
-          data_inicio = "01/01/2000",
-          freq = i_corrente["Frequência"]
+def etapa_coleta_bcb_sgs(codigos, datas_inicio, data_execucao):
+  tarefas = [
+      (
+          "BCB/SGS",
+          coleta_bcb_sgs,
+          {
+              "codigo": codigo,
+              "id": id,
+              "data_inicio": datas_inicio.get(id, pd.Timestamp("2000-01-01")).strftime("%d/%m/%Y"),
+              "freq": freq
+          }
       )
-  )
+      for id, codigo, freq in codigos
+  ]
+  resultados = iter(coletar_em_paralelo(tarefas))
+  df_bruto_bcb_sgs = {
+      "Diária": [],
+      "Mensal": [],
+      "Anual": []
+  }
+  for id, codigo, freq in codigos:
+    df_bruto_bcb_sgs[freq].append(next(resultados))
+  return df_bruto_bcb_sgs
 
 ### BCB/ODATA
 
 # Filtra os códigos de API
 codigos_bcb_odata = (
-    df_metadados
-    .query("Fonte == 'BCB/ODATA'")
-    .reset_index(drop = True)[["Identificador", "Input de Coleta"]]
+    codigos_por_fonte("BCB/ODATA", ["Identificador", "Input de Coleta"])
     .set_index("Identificador")
     .to_dict()["Input de Coleta"]
 )
 
+# Colunas usadas no tratamento (expectativas 12 meses não têm DataReferencia)
+colunas_bcb_odata = {"expec_ipca_12m": ["Data", "Media"]}
+
 # Coleta dados do BCB/ODATA
-df_bruto_bcb_odata = codigos_bcb_odata.copy()
-for id, url in codigos_bcb_odata.items():
-  df_bruto_bcb_odata[id] = coleta_bcb_odata(url, id)
+def etapa_coleta_bcb_odata(codigos, datas_inicio, data_execucao):
+  tarefas = [
+      (
+          "BCB/ODATA",
+          coleta_bcb_odata,
+          {
+              "url": url,
+              "id": id,
+              "data_inicio": datas_inicio.get(id, pd.Timestamp("2000-01-01")),
+              "colunas": colunas_bcb_odata.get(id, ["Data", "DataReferencia", "Media"])
+          }
+      )
+      for id, url in codigos.items()
+  ]
+  return dict(zip(codigos.keys(), coletar_em_paralelo(tarefas)))
 
 ### IBGE/SIDRA
 
 # Filtra os códigos de API
-codigos_ibge_sidra = (
-    df_metadados
-    .query("Fonte == 'IBGE/SIDRA'")
-    .reset_index(drop = True)[["Identificador", "Input de Coleta"]]
-)
+codigos_ibge_sidra = codigos_por_fonte("IBGE/SIDRA", ["Identificador", "Input de Coleta"])
 
 # Coleta dados do IBGE/SIDRA
-df_bruto_ibge_sidra = []
-for i in codigos_ibge_sidra.index:
-  df_bruto_ibge_sidra.append(
-      coleta_ibge_sidra(
-          codigos_ibge_sidra.loc[i, "Input de Coleta"],
-          codigos_ibge_sidra.loc[i, "Identificador"]
-      )
-    )
+def etapa_coleta_ibge_sidra(codigos, datas_inicio, data_execucao):
+  tarefas = [
+      ("IBGE/SIDRA", coleta_ibge_sidra, {"url": url, "id": id, "data_inicio": datas_inicio.get(id)})
+      for id, url in codigos
+  ]
+  return coletar_em_paralelo(tarefas)
 
 ### IPEADATA
 
 # Filtra os códigos de API
-codigos_ipeadata = (
-    df_metadados
-    .query("Fonte == 'IPEADATA'")
-    .reset_index(drop = True)[["Identificador", "Input de Coleta", "Frequência"]]
-)
+codigos_ipeadata = codigos_por_fonte("IPEADATA")
 
 # Coleta dados do IPEADATA
-df_bruto_ipeadata = {
-    "Diária": [],
-    "Mensal": []
-}
-for i in codigos_ipeadata.index:
-  df_bruto_ipeadata[codigos_ipeadata.loc[i, "Frequência"]].append(
-      coleta_ipeadata(
-        codigos_ipeadata.loc[i, "Input de Coleta"],
-        codigos_ipeadata.loc[i, "Identificador"]
-      )
-    )
-  
+def etapa_coleta_ipeadata(codigos, datas_inicio, data_execucao):
+  tarefas = [
+      ("IPEADATA", coleta_ipeadata, {"codigo": codigo, "id": id, "data_inicio": datas_inicio.get(id)})
+      for id, codigo, freq in codigos
+  ]
+  resultados = iter(coletar_em_paralelo(tarefas))
+  df_bruto_ipeadata = {
+      "Diária": [],
+      "Mensal": []
+  }
+  for id, codigo, freq in codigos:
+    df_bruto_ipeadata[freq].append(next(resultados))
+  return df_bruto_ipeadata
+
 ### FRED
 
 # Filtra os códigos de API
-codigos_fred = (
-    df_metadados
-    .query("Fonte == 'FRED'")
-    .reset_index(drop = True)[["Identificador", "Input de Coleta", "Frequência"]]
-)
+codigos_fred = codigos_por_fonte("FRED")
 
 # Coleta dados do FRED
-df_bruto_fred = {
-    "Diária": [],
-    "Mensal": []
-}
+def etapa_coleta_fred(codigos, datas_inicio, data_execucao):
+  tarefas = [
+      ("FRED", coleta_fred, {"codigo": codigo, "id": id, "data_inicio": datas_inicio.get(id)})
+      for id, codigo, freq in codigos
+  ]
+  resultados = iter(coletar_em_paralelo(tarefas))
+  df_bruto_fred = {
+      "Diária": [],
+      "Mensal": []
+  }
+  for id, codigo, freq in codigos:
+    df_bruto_fred[freq].append(next(resultados))
+  return df_bruto_fred
 
-for i in codigos_fred.index:
-  df_bruto_fred[codigos_fred.loc[i, "Frequência"]].append(
-      coleta_fred(
-        codigos_fred.loc[i, "Input de Coleta"],
-        codigos_fred.loc[i, "Identificador"]
-      )
-    )
 
-## Tratamento de dados 
+## Tratamento de dados
 
 ### BCB/SGS
 
-# Dados diárias
-df_bruto_bcb_sgs_diaria = df_bruto_bcb_sgs["Diária"][0].join(df_bruto_bcb_sgs["Diária"][1:]).sort_index()
-
-# Dados mensais
-df_bruto_bcb_sgs_mensal = (
-    df_bruto_bcb_sgs["Mensal"][0]
-    .join(df_bruto_bcb_sgs["Mensal"][1:], how = "outer")
-    .join(
-        (
-            df_bruto_bcb_sgs_diaria
-            .resample("MS")
-            .mean()
-            .drop(["selic"], axis = "columns")
-            .join(
-                (
-                    df_bruto_bcb_sgs_diaria
-                    .assign(ano_mes = lambda x: x.index.to_period("M"))
-                    .groupby("ano_mes")
-                    .head(1)
-                    .filter(["selic"])
-                ),
-                how = "outer"
-            )
-        ),
-        how = "outer"
-    )
-    .join(
-        pd.concat(
-            [df_bruto_bcb_sgs["Anual"][0].resample("MS").ffill(),
-            pd.DataFrame(
-                data = {
-                    "meta_inflacao": df_bruto_bcb_sgs["Anual"][0].iloc[-1].values
-                },
-                index = pd.date_range(
-                  start = df_bruto_bcb_sgs["Anual"][0].index.max() + pd.DateOffset(months = 1),
-                  end = df_bruto_bcb_sgs["Anual"][0].index.max() + pd.DateOffset(months = 11),
-                  freq = "MS"
-                  )
+# Trata dados do BCB/SGS
+def etapa_tratamento_bcb_sgs(df_bruto_bcb_sgs):
+  # Dados diárias
+  df_bruto_bcb_sgs_diaria = df_bruto_bcb_sgs["Diária"][0].join(df_bruto_bcb_sgs["Diária"][1:]).sort_index()
+
+  # Dados mensais
+  df_bruto_bcb_sgs_mensal = (
+      df_bruto_bcb_sgs["Mensal"][0]
+      .join(df_bruto_bcb_sgs["Mensal"][1:], how = "outer")
+      .join(
+          (
+              df_bruto_bcb_sgs_diaria
+              .resample("MS")
+              .mean()
+              .drop(["selic"], axis = "columns")
+              .join(
+                  (
+                      df_bruto_bcb_sgs_diaria
+                      .assign(ano_mes = lambda x: x.index.to_period("M"))
+                      .groupby("ano_mes")
+                      .head(1)
+                      .filter(["selic"])
+                  ),
+                  how = "outer"
               )
-            ]
-        ),
-        how = "outer"
+          ),
+          how = "outer"
+      )
+      .join(
+          pd.concat(
+              [df_bruto_bcb_sgs["Anual"][0].resample("MS").ffill(),
+              pd.DataFrame(
+                  data = {
+                      "meta_inflacao": df_bruto_bcb_sgs["Anual"][0].iloc[-1].values
+                  },
+                  index = pd.date_range(
+                    start = df_bruto_bcb_sgs["Anual"][0].index.max() + pd.DateOffset(months = 1),
+                    end = df_bruto_bcb_sgs["Anual"][0].index.max() + pd.DateOffset(months = 11),
+                    freq = "MS"
+                    )
+                )
+              ]
+          ),
+          how = "outer"
+      )
+      .sort_index()
     )
-    .sort_index()
-  )
 
-### BCB/ODATA
+  return df_bruto_bcb_sgs_diaria, df_bruto_bcb_sgs_mensal
 
-# Filtra expectativas curto prazo ~1 mês à frente e agrega pela média
-df_tratado_bcb_odata_ipca_cp = (
-    df_bruto_bcb_odata["expec_ipca_top5_curto_prazo"]
-    .assign(
-        data = lambda x: pd.to_datetime(x.Data),
-        DataReferencia = lambda x: pd.to_datetime(x.DataReferencia, format = "%m/%Y"),
-        horizonte = lambda x: ((x.DataReferencia - x.data) / np.timedelta64(30, "D")).astype(int),
-        expec_ipca_top5_curto_prazo = lambda x: x.Media
-        )
-    .query("horizonte == 1")
-    .groupby(["DataReferencia"])["expec_ipca_top5_curto_prazo"]
-    .mean()
-    .sort_index()
-    .rename_axis("data")
-    .to_frame()
-)
+### BCB/ODATA
 
-# Filtra expectativas médio prazo ~6 mês à frente e agrega pela média
-df_tratado_bcb_odata_ipca_mp = (
-    df_bruto_bcb_odata["expec_ipca_top5_medio_prazo"]
-    .assign(
-        data = lambda x: pd.to_datetime(x.Data),
-        DataReferencia = lambda x: pd.to_datetime(x.DataReferencia, format = "%m/%Y"),
-        horizonte = lambda x: ((x.DataReferencia - x.data) / np.timedelta64(30, "D")).astype(int),
-        expec_ipca_top5_medio_prazo = lambda x: x.Media
-        )
-    .query("horizonte == 6")
-    .groupby(["DataReferencia"])["expec_ipca_top5_medio_prazo"]
-    .mean()
-    .sort_index()
-    .rename_axis("data")
-    .to_frame()
-)
+# Especificações do tratamento das expectativas do Focus: filtra o horizonte
+# alvo (em unidades de 30 ou 365 dias) e agrega pela média
+especificacoes_focus = [
+    dict(id = "expec_ipca_top5_curto_prazo", referencia = "%m/%Y", horizonte = 1, unidade = "30D", agrupar_por = "DataReferencia"),
+    dict(id = "expec_ipca_top5_medio_prazo", referencia = "%m/%Y", horizonte = 6, unidade = "30D", agrupar_por = "DataReferencia"),
+    dict(id = "expec_ipca_12m", periodo = "M"),
+    dict(id = "expec_selic", referencia = "%Y", periodo = "M", horizonte = 1, unidade = "365D", base = "agregada"),
+    dict(id = "expec_cambio", referencia = "%m/%Y", horizonte = 1, unidade = "30D", agrupar_por = "DataReferencia"),
+    dict(id = "expec_primario", referencia = "%Y", periodo = "M", horizonte = 1, unidade = "365D")
+]
+
+# Coleta apenas as séries com especificação de tratamento: as demais da
+# planilha não entram nas tabelas finais
+codigos_bcb_odata = {
+    espec["id"]: codigos_bcb_odata[espec["id"]]
+    for espec in especificacoes_focus
+    if espec["id"] in codigos_bcb_odata
+}
 
-# Filtra expectativas longo prazo ~1 ano à frente e agrega pela média
-df_tratado_bcb_odata_selic = (
-    df_bruto_bcb_odata["expec_selic"]
-    .assign(
-        data = lambda x: pd.to_datetime(x.Data).dt.to_period("M").dt.to_timestamp(),
-        DataReferencia = lambda x: pd.to_datetime(x.DataReferencia, format = "%Y"),
-        horizonte = lambda x: ((x.DataReferencia - x.data) / np.timedelta64(365, "D")).astype(int),
-        expec_selic = lambda x: x.Media
-        )
-    .query("horizonte == 1")
-    .groupby(["data"])["expec_selic"]
-    .mean()
-    .sort_index()
-    .to_frame()
-)
+# Trata dados do BCB/ODATA
+def etapa_tratamento_bcb_odata(df_bruto_bcb_odata, especificacoes_focus):
+  # Trata e cruza expectativas (todas de frequência mensal)
+  df_tratado_bcb_odata_mensal = tratar_expectativas(df_bruto_bcb_odata, especificacoes_focus)
 
-# Filtra expectativas curto prazo ~1 mês à frente e agrega pela média
-df_tratado_bcb_odata_cambio = (
-    df_bruto_bcb_odata["expec_cambio"]
-    .assign(
-        data = lambda x: pd.to_datetime(x.Data),
-        DataReferencia = lambda x: pd.to_datetime(x.DataReferencia, format = "%m/%Y"),
-        horizonte = lambda x: ((x.DataReferencia - x.data) / np.timedelta64(30, "D")).astype(int),
-        expec_cambio = lambda x: x.Media
-        )
-    .query("horizonte == 1")
-    .groupby(["DataReferencia"])["expec_cambio"]
-    .mean()
-    .sort_index()
-    .rename_axis("data")
-    .to_frame()
-)
+  return df_tratado_bcb_odata_mensal
 
-# Filtra expectativas curto prazo ~12 meses à frente e agrega pela média
-df_tratado_bcb_odata_ipca_lp = (
-    df_bruto_bcb_odata["expec_ipca_12m"]
-    .assign(
-        data = lambda x: pd.to_datetime(x.Data).dt.to_period("M").dt.to_timestamp(),
-        expec_ipca_12m = lambda x: x.Media
-        )
-    .groupby(["data"])["expec_ipca_12m"]
-    .mean()
-    .to_frame()
-)
-
-# Filtra expectativas médio prazo ~9 meses à frente e agrega pela média
-df_tratado_bcb_odata_pib = (
-    df_bruto_bcb_odata["expec_pib"]
-    .assign(
-        DataReferencia = lambda x: pd.PeriodIndex(
-            x.DataReferencia.str.replace(r"(\d{1})/(\d{4})", r"\2-Q\1", regex = True),
-            freq = "Q"
-            ).to_timestamp(),
-        data = lambda x: pd.to_datetime(x.Data).dt.to_period("Q").dt.to_timestamp(),
-        horizonte = lambda x: ((x.DataReferencia - pd.to_datetime(x.Data)) / np.timedelta64(30, "D")).astype(int),
-        expec_pib = lambda x: x.Media
-      )
-    .query("horizonte == 9")
-    .groupby(["data"])["expec_pib"]
-    .mean()
-    .sort_index()
-    .to_frame()
-)
+### IBGE/SIDRA
 
-# Filtra expectativas longo prazo ~1 ano à frente e agrega pela média
-df_tratado_bcb_odata_primario = (
-    df_bruto_bcb_odata["expec_primario"]
-    .assign(
-        DataReferencia = lambda x: pd.to_datetime(x.DataReferencia, format = "%Y"),
-        data = lambda x: pd.to_datetime(x.Data).dt.to_period("M").dt.to_timestamp(),
-        horizonte = lambda x: ((x.DataReferencia - pd.to_datetime(x.Data)) / np.timedelta64(365, "D")).astype(int),
-        expec_primario = lambda x: x.Media
-        )
-    .query("horizonte == 1")
-    .groupby(["data"])["expec_primario"]
-    .mean()
-    .sort_index()
-    .to_frame()
-)
+# Trata dados do IBGE/SIDRA
+def etapa_tratamento_ibge_sidra(df_bruto_ibge_sidra):
+  # Cruza dados
+  df_tratado_ibge_sidra = df_bruto_ibge_sidra[0].join(df_bruto_ibge_sidra[1:], how = "outer").sort_index()
 
-# Cruza dados de mesma frequência
-df_tratado_bcb_odata_lista = [
-    df_tratado_bcb_odata_ipca_mp,
-    df_tratado_bcb_odata_ipca_lp,
-    df_tratado_bcb_odata_selic,
-    df_tratado_bcb_odata_cambio,
-    df_tratado_bcb_odata_primario
-  ]
+  return df_tratado_ibge_sidra
 
-df_tratado_bcb_odata_mensal = df_tratado_bcb_odata_ipca_cp.join(
-    other = df_tratado_bcb_odata_lista,
-    how = "outer"
-    ).sort_index()
+### IPEADATA
 
-### IBGE/SIDRA
+# Trata dados do IPEADATA
+def etapa_tratamento_ipeadata(df_bruto_ipeadata):
+  # Trata dados diários
+  df_tratado_ipeadata_ipcs = (
+      df_bruto_ipeadata["Diária"][0]
+      .assign(ano_mes = lambda x: x.index.to_period("M"))
+      .dropna()
+      .groupby("ano_mes")
+      .tail(1)
+      .filter(["ipc_s"])
+      .assign(data = lambda x: pd.to_datetime(x.index.strftime("%Y-%m-01")))
+      .set_index("data")
+  )
 
-# Cruza dados
-df_tratado_ibge_sidra = df_bruto_ibge_sidra[0].join(df_bruto_ibge_sidra[1:], how = "outer").sort_index()
-
-# Trata dados diários
-df_tratado_ipeadata_ipcs = (
-    df_bruto_ipeadata["Diária"][0]
-    .assign(ano_mes = lambda x: x.index.to_period("M"))
-    .dropna()
-    .groupby("ano_mes")
-    .tail(1)
-    .filter(["ipc_s"])
-    .assign(data = lambda x: pd.to_datetime(x.index.strftime("%Y-%m-01")))
-    .set_index("data")
-)
+  # Trata dados mensais
+  df_tratado_ipeadata_mensal = (
+      df_bruto_ipeadata["Mensal"][0]
+      .join(df_bruto_ipeadata["Mensal"][1:], how = "outer")
+      .join(df_tratado_ipeadata_ipcs, how = "outer")
+      .sort_index()
+  )
 
-# Trata dados mensais
-df_tratado_ipeadata_mensal = (
-    df_bruto_ipeadata["Mensal"][0]
-    .join(df_bruto_ipeadata["Mensal"][1:], how = "outer")
-    .join(df_tratado_ipeadata_ipcs, how = "outer")
-    .sort_index()
-)
+  return df_tratado_ipeadata_mensal
 
 ### FRED
 
-# Mensaliza séries diárias e concatena tabelas mensais
-df_tratado_fred_mensal = (
-    df_bruto_fred["Mensal"][0]
-    .join(df_bruto_fred["Mensal"][1:], how = "outer")
-    .join(pd.concat(df_bruto_fred["Diária"]).resample("MS").mean())
-    .sort_index()
-)
+# Trata dados do FRED
+def etapa_tratamento_fred(df_bruto_fred):
+  # Mensaliza séries diárias e concatena tabelas mensais
+  df_tratado_fred_mensal = (
+      df_bruto_fred["Mensal"][0]
+      .join(df_bruto_fred["Mensal"][1:], how = "outer")
+      .join(pd.concat(df_bruto_fred["Diária"]).resample("MS").mean())
+      .sort_index()
+  )
 
-# Dados diários
-df_tratado_fred_diario = pd.concat(df_bruto_fred["Diária"]).sort_index()
+  # Dados diários
+  df_tratado_fred_diario = pd.concat(df_bruto_fred["Diária"]).sort_index()
+
+  return df_tratado_fred_mensal, df_tratado_fred_diario
+
+
+## Montagem das tabelas finais
+
+# Cruza as fontes e, no modo incremental, atualiza as tabelas armazenadas
+# (tabelas_atuais é None na reconstrução completa). Fontes cuja coleta falhou
+# no modo incremental chegam como None: ficam de fora e suas colunas
+# permanecem como estavam nas tabelas armazenadas
+def etapa_montagem(bcb_sgs, bcb_odata, ibge_sidra, ipeadata, fred, tabelas_atuais, datas_corte):
+  df_bruto_bcb_sgs_diaria, df_bruto_bcb_sgs_mensal = bcb_sgs or (None, None)
+  df_tratado_fred_mensal, df_tratado_fred_diario = fred or (None, None)
+
+  # Dados diários
+  df_diaria = juntar_tabelas([df_bruto_bcb_sgs_diaria, df_tratado_fred_diario])
+  if tabelas_atuais is not None:
+    df_diaria = atualizar_tabela(tabelas_atuais[0], df_diaria, datas_corte)
+
+  # Dados mensais
+  df_mensal = juntar_tabelas([
+      df_bruto_bcb_sgs_mensal,
+      bcb_odata,
+      ibge_sidra,
+      ipeadata,
+      df_tratado_fred_mensal
+  ])
+  if tabelas_atuais is not None:
+    df_mensal = atualizar_tabela(tabelas_atuais[1], df_mensal, datas_corte)
+
+  return df_diaria, df_mensal
+
+
+# Grafo de etapas ----
+
+# Data de execução: a coleta é refeita a cada dia, mas reaproveitada em
+# reexecuções no mesmo dia; tratamento e montagem dependem só das entradas
+data_execucao = date.today().isoformat()
+
+# Função para selecionar as datas de início de coleta de uma fonte
+def datas_inicio_fonte(ids):
+  return {id: datas_inicio[id] for id in ids if id in datas_inicio}
+
+# No modo incremental, a falha de uma fonte (retentativas esgotadas, circuito
+# aberto ou prazo esgotado) não interrompe as demais: a montagem segue sem ela
+etapas = {
+    "coleta_bcb_sgs": dict(
+        funcao = etapa_coleta_bcb_sgs,
+        tolerar_falha = incremental,
+        parametros = dict(
+            codigos = codigos_bcb_sgs[["Identificador", "Input de Coleta", "Frequência"]].values.tolist(),
+            datas_inicio = datas_inicio_fonte(codigos_bcb_sgs["Identificador"]),
+            data_execucao = data_execucao
+        )
+    ),
+    "coleta_bcb_odata": dict(
+        funcao = etapa_coleta_bcb_odata,
+        tolerar_falha = incremental,
+        parametros = dict(
+            codigos = codigos_bcb_odata,
+            datas_inicio = datas_inicio_fonte(codigos_bcb_odata.keys()),
+            data_execucao = data_execucao
+        )
+    ),
+    "coleta_ibge_sidra": dict(
+        funcao = etapa_coleta_ibge_sidra,
+        tolerar_falha = incremental,
+        parametros = dict(
+            codigos = codigos_ibge_sidra[["Identificador", "Input de Coleta"]].values.tolist(),
+            datas_inicio = datas_inicio_fonte(codigos_ibge_sidra["Identificador"]),
+            data_execucao = data_execucao
+        )
+    ),
+    "coleta_ipeadata": dict(
+        funcao = etapa_coleta_ipeadata,
+        tolerar_falha = incremental,
+        parametros = dict(
+            codigos = codigos_ipeadata[["Identificador", "Input de Coleta", "Frequência"]].values.tolist(),
+            datas_inicio = datas_inicio_fonte(codigos_ipeadata["Identificador"]),
+            data_execucao = data_execucao
+        )
+    ),
+    "coleta_fred": dict(
+        funcao = etapa_coleta_fred,
+        tolerar_falha = incremental,
+        parametros = dict(
+            codigos = codigos_fred[["Identificador", "Input de Coleta", "Frequência"]].values.tolist(),
+            datas_inicio = datas_inicio_fonte(codigos_fred["Identificador"]),
+            data_execucao = data_execucao
+        )
+    ),
+    "tratamento_bcb_sgs": dict(funcao = etapa_tratamento_bcb_sgs, dependencias = ["coleta_bcb_sgs"]),
+    "tratamento_bcb_odata": dict(
+        funcao = etapa_tratamento_bcb_odata,
+        dependencias = ["coleta_bcb_odata"],
+        parametros = dict(especificacoes_focus = especificacoes_focus)
+    ),
+    "tratamento_ibge_sidra": dict(funcao = etapa_tratamento_ibge_sidra, dependencias = ["coleta_ibge_sidra"]),
+    "tratamento_ipeadata": dict(funcao = etapa_tratamento_ipeadata, dependencias = ["coleta_ipeadata"]),
+    "tratamento_fred": dict(funcao = etapa_tratamento_fred, dependencias = ["coleta_fred"]),
+    "montagem": dict(
+        funcao = etapa_montagem,
+        dependencias = [
+            "tratamento_bcb_sgs",
+            "tratamento_bcb_odata",
+            "tratamento_ibge_sidra",
+            "tratamento_ipeadata",
+            "tratamento_fred",
+            "tabelas_atuais"
+        ],
+        dependencias_opcionais = [
+            "tratamento_bcb_sgs",
+            "tratamento_bcb_odata",
+            "tratamento_ibge_sidra",
+            "tratamento_ipeadata",
+            "tratamento_fred"
+        ],
+        parametros = dict(datas_corte = datas_corte)
+    )
+}
 
-# DIGITAR O CAMINHO DA PASTA DRIVE PARA SALVAR TABELAS
-PASTA_DRIVE = "dados/"
-os.makedirs(PASTA_DRIVE, exist_ok = True)
+# Tabelas armazenadas (base do modo incremental): entrada externa do grafo, de
+# modo que seu conteúdo faz parte da chave da montagem
+tabelas_atuais = (df_diaria_atual, df_mensal_atual) if incremental else None
 
-# Dados diários
-df_diaria = df_bruto_bcb_sgs_diaria.join(df_tratado_fred_diario, how = "outer").sort_index()
-df_diaria.to_parquet(PASTA_DRIVE + "df_diaria.parquet")
-
-# Dados mensais
-df_mensal = (
-    df_bruto_bcb_sgs_mensal
-    .join(df_tratado_bcb_odata_mensal, how = "outer")
-    .join(df_tratado_ibge_sidra, how = "outer")
-    .join(df_tratado_ipeadata_mensal, how = "outer")
-    .join(df_tratado_fred_mensal, how = "outer")
-    .sort_index()
+# Executa as etapas pedidas (ou todas) e salva as tabelas finais
+resultados = executar_etapas(
+    etapas,
+    alvos = argumentos.etapa,
+    forcar = argumentos.forcar,
+    externas = {"tabelas_atuais": tabelas_atuais}
 )
-df_mensal.to_parquet(PASTA_DRIVE + "df_mensal.parquet")
+if "montagem" in resultados:
+  df_diaria, df_mensal = resultados["montagem"]
+  salvar_painel(df_diaria, PASTA_DRIVE + "df_diaria.parquet")
+  salvar_painel(df_mensal, PASTA_DRIVE + "df_mensal.parquet")
+  # Novas observações do IPCA atualizam os erros das previsões e as visões
+  # iniciais do dashboard
+  atualizar_erros()
+  salvar_inicializacao()
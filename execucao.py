@@ -0,0 +1,176 @@
+# Bibliotecas ----
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from skforecast.utils import transform_dataframe, transform_series
+from preparacao import reverter_y
+
+
+# Parâmetros ----
+
+# Máximo de processos simultâneos (padrão: número de núcleos)
+MAX_PROCESSOS = os.cpu_count() or 1
+
+# Número de blocos em que as réplicas do bootstrap de cada modelo são divididas;
+# fixo, para que o resultado não dependa do número de núcleos da máquina
+BLOCOS_BOOTSTRAP = 8
+
+# Processos filhos criados por fork (quando disponível): ipca.py é um script e
+# não pode ser reimportado pelos processos filhos
+CONTEXTO = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+
+
+# Funções ----
+
+# Função para ajustar um modelo (executada em um processo filho)
+def _ajustar(modelo, y, exog):
+  modelo.fit(y, exog)
+  return modelo
+
+# Função para gerar um bloco de réplicas do bootstrap (executada em um processo filho)
+def _bootstrap(modelo, steps, exog, n_boot, semente):
+  return modelo.predict_bootstrapping(
+    steps = steps,
+    exog = exog,
+    n_boot = n_boot,
+    random_state = semente
+    ).to_numpy()
+
+# Função para verificar se o modelo pode usar a simulação vetorizada: regressor
+# linear (coeficientes e intercepto), sem diferenciação e resíduos sem bins
+def simulacao_linear(modelo):
+  coeficientes = getattr(modelo.regressor, "coef_", None)
+  return (
+    coeficientes is not None
+    and np.ndim(coeficientes) == 1
+    and hasattr(modelo.regressor, "intercept_")
+    and modelo.differentiation is None
+    )
+
+# Função para gerar um bloco de réplicas do bootstrap de um modelo linear de
+# uma vez só (equivalente a predict_bootstrapping, com as mesmas sementes e os
+# mesmos resíduos sorteados): a recursão é propagada para todas as trajetórias
+# juntas, passo a passo, e a transformação de y é revertida em lote
+def _bootstrap_linear(modelo, steps, exog, n_boot, semente):
+  regressor = modelo.regressor
+  n_lags = len(modelo.lags)
+  coef_lags, coef_exog = regressor.coef_[:n_lags], regressor.coef_[n_lags:]
+
+  # Parte determinística de cada passo: intercepto + exógenas transformadas
+  if exog is not None:
+    exog = exog if isinstance(exog, pd.DataFrame) else exog.to_frame()
+    exog = transform_dataframe(exog, modelo.transformer_exog, fit = False, inverse_transform = False)
+    fixo = regressor.intercept_ + exog.to_numpy()[:steps] @ coef_exog
+  else:
+    fixo = np.full(steps, regressor.intercept_, dtype = float)
+
+  # Janela inicial (escala transformada), repetida em todas as trajetórias
+  janela = transform_series(
+    modelo.last_window.iloc[-modelo.window_size:], modelo.transformer_y, fit = False, inverse_transform = False
+    )
+  janela = np.tile(janela.to_numpy(dtype = float), (n_boot, 1))
+
+  # Matriz (n_boot, steps) de resíduos sorteados: cada trajetória usa a semente
+  # que predict_bootstrapping lhe daria
+  residuos = modelo.in_sample_residuals
+  sementes = np.random.default_rng(semente).integers(low = 0, high = 10000, size = n_boot)
+  unicas, posicoes = np.unique(sementes, return_inverse = True)
+  indices = np.array([np.random.default_rng(s).integers(0, len(residuos), size = steps) for s in unicas])
+  sorteados = residuos[indices[posicoes.ravel()]]
+
+  simulacoes = np.empty((n_boot, steps))
+  for passo in range(steps):
+    simulacoes[:, passo] = janela[:, -modelo.lags] @ coef_lags + fixo[passo] + sorteados[:, passo]
+    janela = np.column_stack((janela[:, 1:], simulacoes[:, passo]))
+
+  if modelo.transformer_y is not None:
+    simulacoes = transform_series(
+      pd.Series(simulacoes.ravel(), name = modelo.last_window.name), modelo.transformer_y, fit = False, inverse_transform = True
+      ).to_numpy().reshape(n_boot, steps)
+  return simulacoes.T
+
+# Função para gerar sementes independentes para cada bloco a partir da semente principal
+def sementes_blocos(semente, blocos = BLOCOS_BOOTSTRAP):
+  return [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(semente).spawn(blocos)]
+
+# Função para ajustar vários modelos em paralelo, um por processo
+def ajustar_modelos(modelos, y, exog, max_processos = MAX_PROCESSOS):
+  with ProcessPoolExecutor(max_workers = min(max_processos, len(modelos)), mp_context = CONTEXTO) as executor:
+    futuros = [executor.submit(_ajustar, modelo, y, exog) for modelo in modelos]
+    return [futuro.result() for futuro in futuros]
+
+# Função para produzir previsões com intervalo de vários modelos (equivalente a
+# predict_interval), dividindo as réplicas do bootstrap de cada modelo em blocos
+# com sementes próprias: modelos lineares são simulados de forma vetorizada no
+# próprio processo; os demais, em blocos executados em paralelo. Modelos
+# ajustados com as transformações compartilhadas (preparacao.py) têm previsões
+# e simulações revertidas à escala original por `transformacoes`
+def prever_intervalos(modelos, steps, exog, n_boot, semente, intervalo = [5, 95],
+                      blocos = BLOCOS_BOOTSTRAP, max_processos = MAX_PROCESSOS, transformacoes = None):
+  replicas = [len(bloco) for bloco in np.array_split(np.arange(n_boot), blocos)]
+  sementes = sementes_blocos(semente, blocos)
+  genericos = sum(not simulacao_linear(modelo) for modelo in modelos)
+
+  with ProcessPoolExecutor(max_workers = max(1, min(max_processos, genericos * blocos)), mp_context = CONTEXTO) as executor:
+    futuros = [
+      [executor.submit(_bootstrap, modelo, steps, exog, n, s) for n, s in zip(replicas, sementes) if n > 0]
+      if not simulacao_linear(modelo) else []
+      for modelo in modelos
+    ]
+
+    previsoes = []
+    for modelo, futuros_modelo in zip(modelos, futuros):
+      if futuros_modelo:
+        simulacoes = np.hstack([futuro.result() for futuro in futuros_modelo])
+      else:
+        simulacoes = np.hstack([
+          _bootstrap_linear(modelo, steps, exog, n, s) for n, s in zip(replicas, sementes) if n > 0
+          ])
+      previsao = modelo.predict(steps = steps, exog = exog).to_frame()
+      if transformacoes is not None:
+        simulacoes = reverter_y(transformacoes, simulacoes)
+        previsao["pred"] = reverter_y(transformacoes, previsao["pred"].to_numpy())
+      limites = np.quantile(simulacoes, np.array(intervalo) / 100, axis = 1)
+      previsoes.append(previsao.assign(lower_bound = limites[0], upper_bound = limites[1]))
+  return previsoes
+
+
+# Benchmark ----
+
+if __name__ == "__main__":
+  import time
+  from skforecast.ForecasterAutoreg import ForecasterAutoreg
+  from sklearn.linear_model import Ridge
+  from sklearn.preprocessing import PowerTransformer
+
+  # Série AR(1) sintética com 3 exógenas, nas dimensões do modelo de produção
+  aleatorio = np.random.default_rng(1984)
+  datas = pd.date_range("2004-01-01", periods = 250 + 12, freq = "MS")
+  exog = pd.DataFrame(aleatorio.normal(size = (len(datas), 3)), index = datas, columns = ["x1", "x2", "x3"])
+  y = pd.Series(0.4, index = datas, name = "y")
+  for t in range(1, len(datas)):
+    y.iloc[t] = 0.2 + 0.5 * y.iloc[t - 1] + exog.iloc[t] @ [0.1, -0.2, 0.05] + aleatorio.normal(scale = 0.2)
+
+  modelo = ForecasterAutoreg(
+    regressor = Ridge(),
+    lags = 1,
+    transformer_y = PowerTransformer(),
+    transformer_exog = PowerTransformer()
+    )
+  modelo.fit(y.iloc[:-12], exog.iloc[:-12])
+
+  # Função para medir o tempo (segundos) de um bloco de 5000 réplicas
+  def medir(funcao):
+    inicio = time.perf_counter()
+    simulacoes = funcao(modelo, 12, exog.iloc[-12:], 5000, 1984)
+    return simulacoes, time.perf_counter() - inicio
+
+  referencia, tempo_generico = medir(_bootstrap)
+  simulacoes, tempo_linear = medir(_bootstrap_linear)
+  diferenca = np.abs(np.quantile(simulacoes, [0.05, 0.95], axis = 1) - np.quantile(referencia, [0.05, 0.95], axis = 1)).max()
+  print(f"predict_bootstrapping: {tempo_generico:.3f} s")
+  print(f"vetorizado:            {tempo_linear:.3f} s ({tempo_generico / tempo_linear:.0f}x)")
+  print(f"Maior diferença nos quantis 5% e 95%: {diferenca:.2e}")
@@ -1,20 +1,133 @@
 # Bibliotecas ----
-import pandas as pd
+# (pandas e plotly são importados apenas quando necessários, pelo módulo
+# visoes; a inicialização usa o artefato pronto gerado por ipca.py e etl.py)
+import os
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+from shiny import reactive
+from memorizacao import memorizar
+import inicializacao
 
 
 # Objetos globais ----
 pasta = "dados/"
-df_previsao = pd.read_parquet(pasta + "df_previsao.parquet")
-df_ipca = pd.concat([
-    (
-        pd.read_parquet(pasta + "df_mensal.parquet")
-        .filter(["ipca"])
-        .dropna()
-        .reset_index()
-        .rename(columns = {"ipca": "valor", "data": "data_referencia", "index": "data_referencia"})
-        .assign(variavel = "IPCA", tipo = "Observado")
-    ),
-    df_previsao
-])
-
-modelos = df_previsao.query("variavel == 'IPCA'")["tipo"].unique().tolist()
+
+# Intervalo (segundos) entre verificações de mudança nos arquivos de dados
+intervalo_recarga = 10
+
+# Tabela materializada de erros de previsão (ver tracking.py)
+arquivo_erros = pasta + "erros_previsao.parquet"
+
+
+# Versões dos dados ----
+
+# Função para obter a assinatura (data de modificação e tamanho) dos arquivos de dados
+def assinatura_dados():
+    return tuple((os.stat(c).st_mtime_ns, os.stat(c).st_size) for c in inicializacao.ARQUIVOS_DADOS)
+
+# Função para carregar uma versão (snapshot) imutável dos dados: usa o artefato
+# de inicialização se ele corresponder aos arquivos; senão, lê e valida os dados
+def carregar_versao(versao):
+    artefato = inicializacao.ler_inicializacao(caminho = inicializacao.ARQUIVO_INICIALIZACAO)
+    if artefato is not None:
+        return MappingProxyType({"versao": versao, "modelos": artefato["modelos"], "artefato": artefato})
+    from visoes import carregar_snapshot
+    return carregar_snapshot(versao)
+
+# Versão atual e anterior dos dados: sessões que ainda não viram a troca
+# continuam lendo a versão anterior até serem invalidadas
+_trava_snapshot = threading.Lock()
+_snapshots = OrderedDict()
+
+# Função para trocar a versão atual dos dados (troca atômica da referência)
+def trocar_snapshot(snapshot):
+    with _trava_snapshot:
+        _snapshots[snapshot["versao"]] = snapshot
+        while len(_snapshots) > 2:
+            _snapshots.popitem(last = False)
+
+# Função para obter a versão atual dos dados
+def snapshot_atual():
+    with _trava_snapshot:
+        return next(reversed(_snapshots.values()))
+
+# Função para obter uma versão específica dos dados (ou a atual, se já descartada)
+def snapshot_versao(versao):
+    with _trava_snapshot:
+        return _snapshots.get(versao) or next(reversed(_snapshots.values()))
+
+# Função para observar os arquivos de dados e carregar novas versões em segundo
+# plano; só carrega depois que a assinatura se mantém igual entre duas
+# verificações, evitando ler arquivos ainda sendo gravados
+def observar_dados():
+    anterior = None
+    while True:
+        time.sleep(intervalo_recarga)
+        try:
+            assinatura = assinatura_dados()
+            if assinatura != snapshot_atual()["versao"] and assinatura == anterior:
+                snapshot = carregar_versao(assinatura)
+                # Os arquivos não podem ter mudado durante a leitura
+                if assinatura_dados() == assinatura:
+                    trocar_snapshot(snapshot)
+                    print(f"Dados recarregados: modelos {snapshot['modelos']}")
+            anterior = assinatura
+        except Exception as e:
+            # Versão nova inválida ou incompleta: segue exibindo a atual
+            print(f"Falha ao recarregar os dados, mantendo a versão atual: {e}")
+
+trocar_snapshot(carregar_versao(assinatura_dados()))
+threading.Thread(target = observar_dados, name = "recarga-dados", daemon = True).start()
+
+# Modelos da versão inicial (opções iniciais do seletor)
+modelos = snapshot_atual()["modelos"]
+
+# Versão dos dados, compartilhada por todas as sessões: muda uma única vez
+# por troca e invalida os cálculos que dependem dela
+@reactive.poll(lambda: snapshot_atual()["versao"], interval_secs = 1)
+def versao_dados():
+    return snapshot_atual()["versao"]
+
+
+# Visões por modelo ----
+
+# Visões imutáveis por (modelo, versão dos dados), compartilhadas entre as
+# sessões: N usuários no mesmo modelo custam um único cálculo
+@memorizar()
+def visoes_por_modelo(modelo, versao):
+    from visoes import montar_visoes, visoes_do_artefato
+    snapshot = snapshot_versao(versao)
+    if "artefato" in snapshot:
+        return visoes_do_artefato(snapshot["artefato"], modelo)
+    return montar_visoes(snapshot["df_ipca"], modelo)
+
+# Figura serializada (JSON) por (modelo, versão dos dados), compartilhada entre as sessões
+@memorizar()
+def figura_fanchart(modelo, versao):
+    snapshot = snapshot_versao(versao)
+    if "artefato" in snapshot:
+        return snapshot["artefato"]["visoes"][modelo]["figura"]
+    from visoes import montar_fanchart
+    return montar_fanchart(visoes_por_modelo(modelo, versao)["fanchart"]).to_json()
+
+
+# Tracking das previsões ----
+
+# Função para obter a assinatura (data de modificação e tamanho) da tabela de
+# erros de previsão: as tabelas são refeitas apenas quando ela muda
+def assinatura_erros():
+    return (os.stat(arquivo_erros).st_mtime_ns, os.stat(arquivo_erros).st_size)
+
+# Tabela de tracking por (modelo, versão da tabela de erros), compartilhada entre as sessões
+@memorizar()
+def tabela_tracking_por_modelo(modelo, versao):
+    from visoes import montar_tabela_tracking
+    return montar_tabela_tracking(modelo)
+
+# Versão da tabela de erros, compartilhada por todas as sessões: o arquivo é
+# verificado periodicamente e a versão muda se a data de modificação ou o tamanho mudar
+@reactive.poll(assinatura_erros, interval_secs = 5)
+def versao_tracking():
+    return assinatura_erros()
@@ -0,0 +1,96 @@
+# Bibliotecas ----
+# (apenas a biblioteca padrão: este módulo é lido na inicialização do
+# dashboard, antes de pandas e plotly serem importados)
+import hashlib
+import json
+
+
+# Parâmetros ----
+
+# Arquivos dos dados exibidos no dashboard
+ARQUIVOS_DADOS = ["dados/df_previsao.parquet", "dados/df_mensal.parquet"]
+
+# Artefato de inicialização: lista de modelos e visões iniciais já prontas,
+# gerado a cada nova previsão ou atualização dos dados
+ARQUIVO_INICIALIZACAO = "dados/inicializacao.json"
+
+
+# Funções ----
+
+# Função para calcular o resumo (hash) do conteúdo dos arquivos de dados
+def resumo_dados(arquivos = ARQUIVOS_DADOS):
+    resumo = hashlib.sha256()
+    for caminho in arquivos:
+        with open(caminho, "rb") as arquivo:
+            resumo.update(arquivo.read())
+    return resumo.hexdigest()
+
+# Função para ler o artefato de inicialização, se ele corresponder aos dados atuais
+def ler_inicializacao(arquivos = ARQUIVOS_DADOS, caminho = ARQUIVO_INICIALIZACAO):
+    try:
+        with open(caminho, encoding = "utf-8") as arquivo:
+            artefato = json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+    if artefato.get("resumo") != resumo_dados(arquivos):
+        return None
+    return artefato
+
+
+# Benchmark ----
+
+if __name__ == "__main__":
+    import subprocess
+    import sys
+    import time
+
+    repeticoes = 5
+
+    # Inicialização do dashboard até a primeira sessão ter tudo o que exibe
+    codigo = """
+import time
+inicio = time.perf_counter()
+import inicializacao
+if {sem_artefato}:
+    inicializacao.ARQUIVO_INICIALIZACAO = ""
+import app
+import globals as g
+importado = time.perf_counter()
+modelo, versao = g.modelos[0], g.snapshot_atual()["versao"]
+g.visoes_por_modelo(modelo, versao)["fantable"]
+g.figura_fanchart(modelo, versao)
+print(importado - inicio, time.perf_counter() - inicio)
+"""
+
+    # Função para medir o tempo médio (segundos) de inicialização em processos novos
+    def medir(sem_artefato):
+        tempos = []
+        for _ in range(repeticoes):
+            saida = subprocess.run(
+                [sys.executable, "-c", codigo.format(sem_artefato = sem_artefato)],
+                capture_output = True, text = True, check = True
+                ).stdout.split()
+            tempos.append([float(t) for t in saida[-2:]])
+        return [sum(t) / repeticoes for t in zip(*tempos)]
+
+    if ler_inicializacao() is None:
+        print("Artefato de inicialização ausente ou desatualizado (rode ipca.py ou etl.py)")
+    for nome, sem_artefato in [("sem artefato", True), ("com artefato", False)]:
+        importacao, primeira_sessao = medir(sem_artefato)
+        print(f"{nome}: import app {importacao:.2f} s, dados da primeira sessão {primeira_sessao:.2f} s")
+
+    # Perfil de importação: módulos de primeiro nível mais lentos (python -X importtime)
+    inicio = time.perf_counter()
+    perfil = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        capture_output = True, text = True, check = True
+        ).stderr.splitlines()
+    modulos = []
+    for linha in perfil:
+        if linha.startswith("import time:") and "|" in linha:
+            _, acumulado, nome = linha.split("|")
+            if acumulado.strip().isdigit() and len(nome) - len(nome.lstrip()) <= 5:
+                modulos.append((int(acumulado) / 1000, nome.strip()))
+    print("\nPerfil de importação de app.py (ms acumulados, módulos de 1º e 2º nível):")
+    for tempo, nome in sorted(modulos, reverse = True)[:15]:
+        print(f"  {tempo:8.1f}  {nome}")
@@ -1,60 +1,54 @@
 # Bibliotecas ----
 
 # Importa bibliotecas
+import argparse
 import numpy as np
 import pandas as pd
 from skforecast.ForecasterAutoreg import ForecasterAutoreg
 from sklearn.linear_model import Ridge, HuberRegressor
-from sklearn.preprocessing import PowerTransformer
-from utils import transformar
+from utils import transformar, gravar_atomico
+from metadados import transformacoes
+from acumulacao import acumular_12m, acumular_no_ano
+from tracking import salvar_tracking, atualizar_erros
+from visoes import salvar_inicializacao
+from execucao import prever_intervalos
+from preparacao import (
+    preparar_dados, dummies_sazonais, ajustar_transformacoes, aplicar_transformacoes,
+    INICIO_TREINO, VARIAVEIS_X
+    )
+from regularizacao import escolher_alpha
+from registro import obter_modelos, cronometro, registrar_execucao
+
+# Modo de execução: os modelos são reajustados apenas se os dados de treino,
+# os hiperparâmetros ou a semente mudarem (ou com --reajustar)
+parser = argparse.ArgumentParser(description = "Produz as previsões do IPCA")
+parser.add_argument(
+    "--reajustar",
+    action = "store_true",
+    help = "ignora o registro de modelos e reajusta todos os modelos"
+    )
+argumentos = parser.parse_args()
+
+# Tempo de cada etapa da execução
+marcar = cronometro()
 
 # Organização de dados ----
 
-# Planilha de metadados
-df_metadados = pd.read_excel(
-    io = "https://docs.google.com/spreadsheets/d/1NB1fkck-ol1y5fIETWDkoYG2sFhlgyKsADPfADK_98s/export?format=xlsx",
-    sheet_name = "Metadados"
-    ).set_index("Identificador").filter(["Transformação"]).astype(str)
+# Tipo de transformação de cada série (cópia local da planilha de metadados)
+transformacao = transformacoes()
 
-# Importa dados online
+# Pasta dos dados
 pasta = "dados/"
-dados_brutos = pd.read_parquet(pasta + "df_mensal.parquet")
-
-# Converte frequência
-dados_tratados = dados_brutos.asfreq("MS")
-
-# Separa Y
-y = dados_tratados.ipca.dropna()
-
-# Separa X
-x = dados_tratados.drop(labels = "ipca", axis = "columns").copy()
-
-# Computa transformações
-for col in x.columns.to_list():
-  x[col] = transformar(x[col], df_metadados.loc[col, "Transformação"])
-
-# Filtra amostra
-inicio_treino = pd.to_datetime("2004-01-01") # amostra inicial de treinamento
-y = y[y.index >= inicio_treino]
-x = x.query("index >= @inicio_treino and index <= @y.index.max()")
-
-# Conta por coluna proporção de NAs em relação ao nº de obs. do IPCA
-prop_na = x.isnull().sum() / y.shape[0]
 
-# Remove variáveis que possuem mais de 20% de NAs
-x = x.drop(labels = prop_na[prop_na >= 0.2].index.to_list(), axis = "columns")
+# Amostra inicial de treinamento
+inicio_treino = INICIO_TREINO
 
-# Preenche NAs restantes com a vizinhança
-x = x.bfill().ffill()
+# Regressores candidatos (além das dummies sazonais e do lag)
+variaveis_x = VARIAVEIS_X
 
-# Adiciona dummies sazonais
-dummies_sazonais = (
-    pd.get_dummies(y.index.month_name())
-    .astype(int)
-    .drop(labels = "December", axis = "columns")
-    .set_index(y.index)
-)
-x = x.join(other = dummies_sazonais, how = "outer")
+# Dados de treino: IPCA e regressores transformados (sem NAs, com dummies sazonais)
+y, x = preparar_dados(transformacao, variaveis_x, inicio_treino)
+marcar("dados")
 
 
 # Produção de previsões ----
@@ -65,29 +59,40 @@ semente = 1984
 h = 12
 
 # Seleção final de variáveis
-x_reg = [
-    "expec_ipca_top5_curto_prazo",
-    "ic_br",
-    "cambio_brl_eur",
-    "ipc_s"
-    ] + dummies_sazonais.columns.to_list() # + 1 lag
-
-# Reestima os 2 melhores modelos com amostra completa
+x_reg = variaveis_x + dummies_sazonais(y.index).columns.to_list() # + 1 lag
+
+# Transformações Yeo-Johnson de y e dos regressores, ajustadas uma única vez
+# por versão dos dados (guardadas em disco) e compartilhadas pelos modelos
+transformacoes_yj = ajustar_transformacoes(y, x[x_reg])
+y_yj, x_yj = aplicar_transformacoes(transformacoes_yj, y, x[x_reg])
+
+# Reestima os 2 melhores modelos com amostra completa (nos dados já
+# transformados): reaproveita do registro os modelos já ajustados com os mesmos
+# dados (os demais são ajustados em paralelo)
 modelo1 = ForecasterAutoreg(
     regressor = Ridge(random_state = semente),
-    lags = 1,
-    transformer_y = PowerTransformer(),
-    transformer_exog = PowerTransformer()
+    lags = 1
     )
-modelo1.fit(y, x[x_reg])
 
 modelo2 = ForecasterAutoreg(
     regressor = HuberRegressor(),
-    lags = 1,
-    transformer_y = PowerTransformer(),
-    transformer_exog = PowerTransformer()
+    lags = 1
+    )
+
+# Penalidade (alpha) da Ridge escolhida a cada execução pelo menor erro
+# leave-one-out, calculado para toda a grade a partir de uma única SVD
+alpha_ridge, _ = escolher_alpha(modelo1, y_yj, x_yj)
+modelo1.regressor.set_params(alpha = alpha_ridge)
+print(f"Alpha da Ridge: {alpha_ridge:.4g}")
+
+(modelo1, modelo2), metadados_modelos = obter_modelos(
+    [modelo1, modelo2],
+    y_yj,
+    x_yj,
+    semente = semente,
+    forcar = argumentos.reajustar
     )
-modelo2.fit(y, x[x_reg])
+marcar("ajuste")
 
 # Período de previsão fora da amostra
 periodo_previsao = pd.date_range(
@@ -198,7 +203,7 @@ dados_cenario_cambio = (
     .filter(["Mediana"])
     .rename(columns = {"Mediana": "cambio_brl_eur"})
     .assign(
-        cambio_brl_eur = lambda x: transformar(x.cambio_brl_eur, df_metadados.loc["cambio_brl_eur"].iloc[0])
+        cambio_brl_eur = lambda x: transformar(x.cambio_brl_eur, transformacao.loc["cambio_brl_eur"])
         )
     .dropna()
 )
@@ -242,28 +247,32 @@ dados_cenarios = (
             dados_cenario_ic_br,
             dados_cenario_cambio,
             dados_cenario_ipc_s,
-            (
-                pd.get_dummies(dados_cenario_exp_ipca.index.month_name())
-                .astype(int)
-                .drop(labels = "December", axis = "columns")
-                .set_index(dados_cenario_exp_ipca.index)
-            )
+            dummies_sazonais(dados_cenario_exp_ipca.index)
             ],
         how = "outer"
         )
     .asfreq("MS")
 )
+marcar("cenarios")
 
 ## Previsão
 
-# Produz previsões
+# Produz previsões: as réplicas do bootstrap de cada modelo são divididas em
+# blocos com sementes derivadas de `semente` (Ridge e Huber são lineares e
+# simulados de forma vetorizada); os cenários passam pelas mesmas
+# transformações do treino e as previsões voltam à escala original
+intervalo1, intervalo2 = prever_intervalos(
+    [modelo1, modelo2],
+    steps = h,
+    exog = aplicar_transformacoes(transformacoes_yj, exog = dados_cenarios)[1],
+    n_boot = 5000,
+    semente = semente,
+    transformacoes = transformacoes_yj
+    )
+marcar("previsao")
+
 previsao1 = (
-   modelo1.predict_interval(
-      steps = h,
-      exog = dados_cenarios,
-      n_boot = 5000,
-      random_state = semente
-      )
+    intervalo1
     .reset_index()
     .assign(
         variavel = "IPCA",
@@ -281,12 +290,7 @@ previsao1 = (
 )
 
 previsao2 = (
-   modelo2.predict_interval(
-      steps = h,
-      exog = dados_cenarios,
-      n_boot = 5000,
-      random_state = semente
-      )
+    intervalo2
     .reset_index()
     .assign(
         variavel = "IPCA",
@@ -303,7 +307,29 @@ previsao2 = (
     )
 )
 
-# Salvar previsões
+# Salvar previsões (gravação atômica: o dashboard em execução nunca lê um arquivo pela metade)
 df_previsao = pd.concat([previsao1, previsao2])
-df_previsao.drop(labels = "data_previsao", axis = "columns").to_parquet(pasta + "df_previsao.parquet")
-df_previsao.to_csv(pasta + "tracking.csv", mode = "a", index = False, header = False)
+gravar_atomico(
+    pasta + "df_previsao.parquet",
+    lambda temporario: df_previsao.drop(labels = "data_previsao", axis = "columns").to_parquet(temporario)
+    )
+salvar_tracking(df_previsao)
+atualizar_erros()
+
+# Artefato de inicialização do dashboard (modelos e visões já prontas)
+salvar_inicializacao()
+marcar("gravacao")
+registrar_execucao(marcar.tempos, metadados_modelos)
+print("Tempo de cada etapa (s):", marcar.tempos)
+
+# Resumo das previsões acumuladas (12 meses e no ano), emendadas ao IPCA observado
+for modelo, previsao in df_previsao.groupby("tipo"):
+  mensal = pd.concat([y, previsao.set_index("data_referencia").valor]).asfreq("MS")
+  print(
+    f"IPCA acumulado previsto ({modelo}):",
+    pd.DataFrame({
+      "12 meses": acumular_12m(mensal),
+      "no ano": acumular_no_ano(mensal)
+      }).tail(h).round(2),
+    sep = "\n"
+    )
@@ -0,0 +1,122 @@
+# Bibliotecas ----
+
+import functools
+import threading
+from collections import OrderedDict
+
+
+# Parâmetros ----
+
+# Máximo de resultados guardados por função; acima disso, descarta os usados
+# há mais tempo (LRU)
+MAX_ENTRADAS = 32
+
+
+# Funções ----
+
+# Função (decorador) para memorizar os resultados de uma função no processo,
+# compartilhados entre todas as sessões: a chave são os argumentos posicionais
+# (por exemplo, modelo e versão dos dados). Chamadas simultâneas com a mesma
+# chave esperam um único cálculo
+def memorizar(maximo = MAX_ENTRADAS):
+  def decorador(funcao):
+    entradas = OrderedDict()
+    travas_chave = {}
+    trava = threading.Lock()
+    contagem = {"acertos": 0, "calculos": 0}
+
+    @functools.wraps(funcao)
+    def memorizada(*chave):
+      with trava:
+        if chave in entradas:
+          entradas.move_to_end(chave)
+          contagem["acertos"] += 1
+          return entradas[chave]
+        trava_chave = travas_chave.setdefault(chave, threading.Lock())
+
+      with trava_chave:
+        # Outra chamada pode ter calculado o resultado enquanto esta esperava
+        with trava:
+          if chave in entradas:
+            entradas.move_to_end(chave)
+            contagem["acertos"] += 1
+            return entradas[chave]
+        try:
+          resultado = funcao(*chave)
+        except BaseException:
+          with trava:
+            travas_chave.pop(chave, None)
+          raise
+        # Guarda o resultado e libera a trava da chave na mesma seção crítica:
+        # uma chamada que chegue depois encontra um ou outro
+        with trava:
+          entradas[chave] = resultado
+          travas_chave.pop(chave, None)
+          contagem["calculos"] += 1
+          while len(entradas) > maximo:
+            entradas.popitem(last = False)
+      return resultado
+
+    # Funções auxiliares: estatísticas de uso e limpeza do cache
+    def estatisticas():
+      with trava:
+        return dict(contagem, entradas = len(entradas))
+
+    def limpar():
+      with trava:
+        entradas.clear()
+        contagem.update(acertos = 0, calculos = 0)
+
+    memorizada.estatisticas = estatisticas
+    memorizada.limpar = limpar
+    return memorizada
+  return decorador
+
+
+# Teste de carga ----
+
+if __name__ == "__main__":
+  import argparse
+  import random
+  import time
+  from concurrent.futures import ThreadPoolExecutor
+  import globals as g
+  import visoes
+
+  parser = argparse.ArgumentParser(description = "Simula sessões simultâneas do dashboard")
+  parser.add_argument("--sessoes", type = int, default = 200, help = "número de sessões simuladas")
+  parser.add_argument("--trocas", type = int, default = 5, help = "trocas de modelo por sessão")
+  argumentos = parser.parse_args()
+
+  snapshot = g.snapshot_atual()
+  df_ipca = visoes.carregar_snapshot(snapshot["versao"])["df_ipca"]
+  versao_tracking = g.assinatura_erros()
+
+  # Cada sessão troca de modelo algumas vezes e lê tudo o que o servidor exibe
+  def sessao(obter_visoes, tabela_tracking_por_modelo, semente):
+    aleatorio = random.Random(semente)
+    for _ in range(argumentos.trocas):
+      modelo = aleatorio.choice(snapshot["modelos"])
+      obter_visoes(modelo, snapshot["versao"])
+      tabela_tracking_por_modelo(modelo, versao_tracking)
+
+  # Função para simular as sessões em paralelo e medir o tempo total (segundos)
+  def simular(obter_visoes, tabela_tracking_por_modelo):
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers = 16) as executor:
+      list(executor.map(lambda s: sessao(obter_visoes, tabela_tracking_por_modelo, s), range(argumentos.sessoes)))
+    return time.perf_counter() - inicio
+
+  sem_cache = simular(
+    lambda modelo, versao: visoes.montar_visoes(df_ipca, modelo),
+    lambda modelo, versao: visoes.montar_tabela_tracking(modelo)
+    )
+  g.visoes_por_modelo.limpar()
+  g.tabela_tracking_por_modelo.limpar()
+  com_cache = simular(g.visoes_por_modelo, g.tabela_tracking_por_modelo)
+
+  print(f"{argumentos.sessoes} sessões x {argumentos.trocas} trocas de modelo ({len(snapshot['modelos'])} modelos)")
+  print(f"  sem cache: {sem_cache:.2f} s")
+  print(f"  com cache: {com_cache:.2f} s")
+  print(f"  visões:    {g.visoes_por_modelo.estatisticas()}")
+  print(f"  tracking:  {g.tabela_tracking_por_modelo.estatisticas()}")
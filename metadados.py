@@ -0,0 +1,113 @@
+# Bibliotecas ----
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import time
+import pandas as pd
+from transporte import requisitar
+from utils import gravar_atomico, gravar_json
+
+
+# Parâmetros ----
+
+# Planilha de metadados (exportação XLSX do Google Sheets)
+URL_METADADOS = "https://docs.google.com/spreadsheets/d/1NB1fkck-ol1y5fIETWDkoYG2sFhlgyKsADPfADK_98s/export?format=xlsx"
+ABA_METADADOS = "Metadados"
+
+# Cópia local compacta e arquivo de controle (hash do conteúdo e data de atualização)
+PASTA = "dados/"
+ARQUIVO_METADADOS = PASTA + "metadados.parquet"
+ARQUIVO_CONTROLE = PASTA + "metadados.json"
+
+# Validade da cópia local (segundos): maior que o intervalo do agendamento
+# diário, para que nem toda execução baixe a planilha (alterações urgentes:
+# python metadados.py --invalidar)
+VALIDADE = 7 * 24 * 3600
+
+_metadados = None
+
+
+# Funções ----
+
+# Função para ler o arquivo de controle da cópia local
+def _ler_controle():
+  try:
+    with open(ARQUIVO_CONTROLE, encoding = "utf-8") as arquivo:
+      return json.load(arquivo)
+  except (OSError, ValueError):
+    return {}
+
+# Função para gravar o arquivo de controle da cópia local
+def _gravar_controle(controle):
+  gravar_json(ARQUIVO_CONTROLE, controle, indent = 2)
+
+# Função para baixar a planilha e atualizar a cópia local, se o conteúdo mudou
+def atualizar_metadados():
+  global _metadados
+  _, _, conteudo = requisitar(URL_METADADOS)
+  resumo = hashlib.sha256(conteudo).hexdigest()
+  controle = _ler_controle()
+
+  # Só lê o XLSX quando o conteúdo da planilha mudou
+  if controle.get("hash") != resumo or not os.path.exists(ARQUIVO_METADADOS):
+    print("Atualizando cópia local dos metadados...")
+    df = pd.read_excel(io = io.BytesIO(conteudo), sheet_name = ABA_METADADOS)
+    colunas_texto = df.select_dtypes(include = "object").columns
+    df[colunas_texto] = df[colunas_texto].astype("string")
+    os.makedirs(PASTA, exist_ok = True)
+    gravar_atomico(ARQUIVO_METADADOS, lambda temporario: df.to_parquet(temporario, index = False))
+    _metadados = None
+
+  _gravar_controle({"hash": resumo, "atualizado": time.time()})
+
+# Função para forçar a atualização da cópia local na próxima leitura
+def invalidar_metadados():
+  global _metadados
+  controle = _ler_controle()
+  controle["atualizado"] = 0
+  _gravar_controle(controle)
+  _metadados = None
+
+# Função para carregar os metadados, atualizando a cópia local se vencida
+def carregar_metadados():
+  global _metadados
+  controle = _ler_controle()
+  vencida = time.time() - controle.get("atualizado", 0) >= VALIDADE
+  if vencida or not os.path.exists(ARQUIVO_METADADOS):
+    try:
+      atualizar_metadados()
+    except Exception as e:
+      # Sem acesso à planilha, segue com a cópia local (se existir)
+      if not os.path.exists(ARQUIVO_METADADOS):
+        raise
+      print(f"Falha ao atualizar metadados, usando cópia local: {e}")
+  if _metadados is None:
+    _metadados = pd.read_parquet(ARQUIVO_METADADOS)
+  return _metadados
+
+# Função para obter os códigos de coleta de uma fonte
+def codigos_por_fonte(fonte, colunas = None):
+  if colunas is None:
+    colunas = ["Identificador", "Input de Coleta", "Frequência"]
+  return (
+    carregar_metadados()
+    .query("Fonte == @fonte")
+    .reset_index(drop = True)[colunas]
+  )
+
+# Função para obter o tipo de transformação de cada série
+def transformacoes():
+  return carregar_metadados().set_index("Identificador")["Transformação"].astype(str)
+
+
+# Atualização manual ----
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description = "Atualiza a cópia local dos metadados")
+  parser.add_argument("--invalidar", action = "store_true", help = "força o download da planilha")
+  if parser.parse_args().invalidar:
+    invalidar_metadados()
+  print(carregar_metadados())
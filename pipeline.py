@@ -0,0 +1,139 @@
+# Bibliotecas ----
+
+import glob
+import hashlib
+import inspect
+import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from utils import gravar_bytes
+
+
+# Parâmetros ----
+
+# Pasta dos artefatos intermediários das etapas
+PASTA_ARTEFATOS = "cache/etapas/"
+
+# Máximo de etapas executadas simultaneamente
+MAX_ETAPAS_SIMULTANEAS = 8
+
+
+# Funções ----
+
+# Função para listar as etapas necessárias para produzir os alvos (entradas
+# externas não são etapas: já vêm prontas)
+def etapas_necessarias(etapas, alvos, externas = ()):
+  necessarias = set()
+  pendentes = list(alvos)
+  while pendentes:
+    nome = pendentes.pop()
+    if nome in externas:
+      continue
+    if nome not in etapas:
+      raise ValueError(f"Etapa inválida: {nome}")
+    if nome not in necessarias:
+      necessarias.add(nome)
+      pendentes.extend(etapas[nome].get("dependencias", []))
+  return necessarias
+
+# Função para obter o código de uma etapa (alterar a função invalida seus artefatos)
+def codigo_etapa(funcao):
+  try:
+    return inspect.getsource(funcao)
+  except (OSError, TypeError):
+    return funcao.__code__.co_code.hex()
+
+# Função para calcular a chave de uma etapa: nome, código, parâmetros e conteúdo das entradas
+def chave_etapa(nome, etapa, resumos_entradas):
+  conteudo = repr((
+    nome,
+    codigo_etapa(etapa["funcao"]),
+    sorted(etapa.get("parametros", {}).items()),
+    resumos_entradas
+  ))
+  return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()[:16]
+
+# Função para executar uma etapa, reaproveitando o artefato se a chave não mudou
+def executar_etapa(nome, etapa, entradas, resumos_entradas, forcar = False):
+  caminho = f"{PASTA_ARTEFATOS}{nome}-{chave_etapa(nome, etapa, resumos_entradas)}.pkl"
+
+  if not forcar and os.path.exists(caminho):
+    print(f"Etapa {nome}: reaproveitando artefato")
+    with open(caminho, "rb") as arquivo:
+      conteudo = arquivo.read()
+    return pickle.loads(conteudo), hashlib.sha256(conteudo).hexdigest()
+
+  print(f"Etapa {nome}: executando...")
+  resultado = etapa["funcao"](*entradas, **etapa.get("parametros", {}))
+  conteudo = pickle.dumps(resultado)
+
+  # Grava o novo artefato e descarta os anteriores da mesma etapa
+  os.makedirs(PASTA_ARTEFATOS, exist_ok = True)
+  gravar_bytes(caminho, conteudo)
+  for antigo in glob.glob(f"{PASTA_ARTEFATOS}{nome}-*.pkl"):
+    if antigo != caminho:
+      os.remove(antigo)
+
+  return resultado, hashlib.sha256(conteudo).hexdigest()
+
+# Função para executar o grafo de etapas; etapas independentes rodam em paralelo
+# e só são recalculadas aquelas cujos código, parâmetros ou entradas mudaram.
+# Entradas externas (dados lidos fora do grafo) podem ser dependências das
+# etapas: entram na chave pelo resumo do conteúdo. Uma etapa com
+# "tolerar_falha" que falha resulta em None e as etapas que dependem dela são
+# ignoradas, exceto as que a declaram em "dependencias_opcionais" (recebem None)
+def executar_etapas(etapas, alvos = None, forcar = False, externas = None):
+  externas = externas or {}
+  pendentes = etapas_necessarias(etapas, alvos or list(etapas), externas)
+  resultados = dict(externas)
+  resumos = {nome: hashlib.sha256(pickle.dumps(valor)).hexdigest() for nome, valor in externas.items()}
+  falhas = set()
+  em_execucao = {}
+
+  with ThreadPoolExecutor(max_workers = MAX_ETAPAS_SIMULTANEAS) as executor:
+    while pendentes or em_execucao:
+      prontas = [
+        nome for nome in sorted(pendentes)
+        if all(dep in resultados for dep in etapas[nome].get("dependencias", []))
+      ]
+      for nome in prontas:
+        pendentes.remove(nome)
+        dependencias = etapas[nome].get("dependencias", [])
+        ausentes = [
+          dep for dep in dependencias
+          if dep in falhas and dep not in etapas[nome].get("dependencias_opcionais", [])
+        ]
+        if ausentes:
+          print(f"Etapa {nome}: ignorada (falha em {', '.join(ausentes)})")
+          resultados[nome], resumos[nome] = None, None
+          falhas.add(nome)
+          continue
+        futuro = executor.submit(
+          executar_etapa,
+          nome,
+          etapas[nome],
+          [resultados[dep] for dep in dependencias],
+          [resumos[dep] for dep in dependencias],
+          forcar
+          )
+        em_execucao[futuro] = nome
+
+      if not em_execucao:
+        # Etapas ignoradas podem ter liberado outras
+        if prontas:
+          continue
+        raise ValueError(f"Dependência circular entre as etapas: {sorted(pendentes)}")
+
+      concluidos, _ = wait(em_execucao, return_when = FIRST_COMPLETED)
+      for futuro in concluidos:
+        nome = em_execucao.pop(futuro)
+        try:
+          resultados[nome], resumos[nome] = futuro.result()
+        except Exception as e:
+          if not etapas[nome].get("tolerar_falha"):
+            raise
+          print(f"Etapa {nome}: falhou ({e}); seguindo sem ela")
+          resultados[nome], resumos[nome] = None, None
+          falhas.add(nome)
+
+  return {nome: resultados[nome] for nome in resultados if nome not in externas}
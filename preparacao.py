@@ -0,0 +1,133 @@
+# Bibliotecas ----
+
+import glob
+import hashlib
+import os
+import joblib
+import pandas as pd
+import sklearn
+from sklearn.preprocessing import PowerTransformer
+from utils import transformar, gravar_atomico, limpar_lru
+from armazenamento import ler_painel
+
+
+# Parâmetros ----
+
+# Painel mensal com o IPCA e os regressores
+ARQUIVO_MENSAL = "dados/df_mensal.parquet"
+
+# Amostra inicial de treinamento
+INICIO_TREINO = pd.to_datetime("2004-01-01")
+
+# Regressores candidatos (além das dummies sazonais e do lag)
+VARIAVEIS_X = [
+  "expec_ipca_top5_curto_prazo",
+  "ic_br",
+  "cambio_brl_eur",
+  "ipc_s"
+  ]
+
+# Proporção máxima de NAs de um regressor (em relação ao nº de obs. do IPCA)
+MAX_PROPORCAO_NA = 0.2
+
+# Pasta das transformações Yeo-Johnson já ajustadas, uma por versão dos dados
+# (nomeadas pelo resumo de y e x), e máximo de versões guardadas (LRU)
+PASTA_TRANSFORMACOES = "cache/transformacoes/"
+MAX_TRANSFORMACOES = 500
+
+
+# Funções ----
+
+# Função para gerar dummies sazonais mensais (dezembro é a categoria base)
+def dummies_sazonais(indice):
+  return (
+    pd.get_dummies(indice.month_name())
+    .astype(int)
+    .drop(labels = "December", axis = "columns")
+    .set_index(indice)
+  )
+
+# Função para preparar os dados dos modelos: y (IPCA) e x (regressores
+# transformados conforme os metadados, sem NAs, com dummies sazonais)
+def preparar_dados(transformacao, variaveis_x = VARIAVEIS_X, inicio_treino = INICIO_TREINO,
+                   arquivo = ARQUIVO_MENSAL):
+
+  # Apenas as colunas usadas, desde 1 ano antes do início do treino (margem
+  # para as transformações em diferença)
+  dados = ler_painel(
+    arquivo,
+    colunas = ["ipca"] + variaveis_x,
+    inicio = inicio_treino - pd.DateOffset(years = 1)
+    ).asfreq("MS")
+
+  y = dados.ipca.dropna()
+  x = dados.drop(labels = "ipca", axis = "columns").copy()
+
+  # Computa transformações
+  for col in x.columns.to_list():
+    x[col] = transformar(x[col], transformacao.loc[col])
+
+  # Filtra amostra
+  y = y[y.index >= inicio_treino]
+  x = x.query("index >= @inicio_treino and index <= @y.index.max()")
+
+  # Remove variáveis com NAs demais e preenche os restantes com a vizinhança
+  prop_na = x.isnull().sum() / y.shape[0]
+  x = x.drop(labels = prop_na[prop_na >= MAX_PROPORCAO_NA].index.to_list(), axis = "columns")
+  x = x.bfill().ffill()
+
+  return y, x.join(other = dummies_sazonais(y.index), how = "outer")
+
+
+# Transformações compartilhadas ----
+
+# Função para calcular o resumo (hash) de uma série ou tabela: valores, índice e nomes das colunas
+def resumo_tabela(dados):
+  resumo = hashlib.sha256(pd.util.hash_pandas_object(dados, index = True).to_numpy().tobytes())
+  resumo.update(repr(dados.columns.tolist() if isinstance(dados, pd.DataFrame) else dados.name).encode("utf-8"))
+  return resumo.hexdigest()
+
+# Função para obter as transformações Yeo-Johnson (PowerTransformer) de y e dos
+# regressores, ajustadas uma única vez por versão dos dados e compartilhadas
+# por todos os modelos (em ipca.py e na avaliação): os lambdas estimados ficam
+# em disco, nomeados pelo resumo dos dados
+def ajustar_transformacoes(y, exog, pasta = PASTA_TRANSFORMACOES):
+  chave = hashlib.sha256(
+    repr((resumo_tabela(y), resumo_tabela(exog), sklearn.__version__)).encode("utf-8")
+    ).hexdigest()[:16]
+  caminho = f"{pasta}{chave}.joblib"
+
+  try:
+    transformacoes = joblib.load(caminho)
+    os.utime(caminho)
+    return transformacoes
+  except (OSError, ValueError, EOFError):
+    pass
+
+  transformacoes = {
+    "y": PowerTransformer().fit(y.to_frame()),
+    "exog": PowerTransformer().fit(exog)
+  }
+  os.makedirs(pasta, exist_ok = True)
+  gravar_atomico(caminho, lambda temporario: joblib.dump(transformacoes, temporario))
+  # Descarta as usadas há mais tempo (outros processos podem estar limpando a pasta ao mesmo tempo)
+  limpar_lru([[arquivo] for arquivo in glob.glob(f"{pasta}*.joblib")], MAX_TRANSFORMACOES)
+  return transformacoes
+
+# Função para aplicar as transformações a y e/ou aos regressores (na ordem de
+# colunas do ajuste)
+def aplicar_transformacoes(transformacoes, y = None, exog = None):
+  if y is not None:
+    y = pd.Series(transformacoes["y"].transform(y.to_frame()).ravel(), index = y.index, name = y.name)
+  if exog is not None:
+    colunas = transformacoes["exog"].feature_names_in_
+    exog = pd.DataFrame(transformacoes["exog"].transform(exog[colunas]), index = exog.index, columns = colunas)
+  return y, exog
+
+# Função para reverter a transformação de y em valores de qualquer formato
+# (previsões ou matrizes de simulações)
+def reverter_y(transformacoes, valores):
+  transformador = transformacoes["y"]
+  return transformador.inverse_transform(
+    pd.DataFrame(valores.reshape(-1, 1), columns = transformador.feature_names_in_)
+    ).reshape(valores.shape)
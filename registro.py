@@ -0,0 +1,156 @@
+# Bibliotecas ----
+
+import glob
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+import joblib
+import pandas as pd
+import sklearn
+import skforecast
+from execucao import ajustar_modelos
+from preparacao import resumo_tabela
+from utils import gravar_atomico, gravar_json, limpar_lru
+
+
+# Parâmetros ----
+
+# Pasta do registro de modelos ajustados: um arquivo joblib por modelo e um
+# json com seus metadados, ambos nomeados pela chave do modelo
+PASTA_REGISTRO = "cache/modelos/"
+
+# Máximo de modelos guardados; acima disso, descarta os usados há mais tempo (LRU)
+MAX_MODELOS = 50
+
+# Histórico de execuções (tempos de cada etapa e modelos usados), uma linha json por execução
+ARQUIVO_EXECUCOES = PASTA_REGISTRO + "execucoes.jsonl"
+
+
+# Funções ----
+
+# Função para descrever os hiperparâmetros de um modelo (ainda não ajustado)
+def hiperparametros(modelo):
+  return {
+    "forecaster": type(modelo).__name__,
+    "regressor": repr(modelo.regressor),
+    "parametros_regressor": {k: repr(v) for k, v in sorted(modelo.regressor.get_params().items())},
+    "lags": [int(lag) for lag in modelo.lags],
+    "transformer_y": repr(modelo.transformer_y),
+    "transformer_exog": repr(modelo.transformer_exog),
+    "differentiation": modelo.differentiation
+  }
+
+# Função para calcular a chave de um modelo: dados de treino, hiperparâmetros,
+# semente e versões das bibliotecas (um joblib só é lido pelas mesmas versões)
+def chave_modelo(modelo, y, exog, semente):
+  conteudo = repr((
+    resumo_tabela(y),
+    resumo_tabela(exog),
+    sorted(hiperparametros(modelo).items()),
+    semente,
+    skforecast.__version__,
+    sklearn.__version__
+  ))
+  return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()[:16]
+
+# Função para gravar um modelo ajustado e seus metadados no registro
+def salvar_modelo(modelo, chave, semente, tempo_ajuste):
+  os.makedirs(PASTA_REGISTRO, exist_ok = True)
+  metadados = {
+    "chave": chave,
+    **hiperparametros(modelo),
+    "semente": semente,
+    "inicio_treino": str(modelo.training_range[0].date()),
+    "fim_treino": str(modelo.training_range[-1].date()),
+    "exog": list(modelo.exog_col_names or []),
+    "residuos": len(modelo.in_sample_residuals),
+    "ajustado_em": datetime.now().isoformat(timespec = "seconds"),
+    "tempo_ajuste": round(tempo_ajuste, 3),
+    "versoes": {"skforecast": skforecast.__version__, "sklearn": sklearn.__version__}
+  }
+  gravar_atomico(f"{PASTA_REGISTRO}{chave}.joblib", lambda caminho: joblib.dump(modelo, caminho))
+  gravar_json(f"{PASTA_REGISTRO}{chave}.json", metadados, ensure_ascii = False, indent = 2)
+  return metadados
+
+# Função para ler um modelo do registro (None se ausente ou ilegível); a data
+# de modificação marca o último uso
+def ler_modelo(chave):
+  try:
+    modelo = joblib.load(f"{PASTA_REGISTRO}{chave}.joblib")
+    with open(f"{PASTA_REGISTRO}{chave}.json", encoding = "utf-8") as arquivo:
+      metadados = json.load(arquivo)
+    os.utime(f"{PASTA_REGISTRO}{chave}.joblib")
+    return modelo, metadados
+  except (OSError, ValueError, EOFError):
+    return None
+
+# Função para descartar os modelos usados há mais tempo, acima do máximo
+def limpar_registro(maximo = MAX_MODELOS):
+  limpar_lru(
+    [[modelo, modelo[:-len(".joblib")] + ".json"] for modelo in glob.glob(f"{PASTA_REGISTRO}*.joblib")],
+    maximo
+    )
+
+# Função para obter modelos ajustados: reaproveita do registro os que têm a mesma
+# chave (mesmos dados, hiperparâmetros e semente) e ajusta apenas os demais, em paralelo
+def obter_modelos(modelos, y, exog, semente, forcar = False):
+  chaves = [chave_modelo(modelo, y, exog, semente) for modelo in modelos]
+  registrados = [None if forcar else ler_modelo(chave) for chave in chaves]
+
+  faltantes = [i for i, registrado in enumerate(registrados) if registrado is None]
+  if faltantes:
+    inicio = time.perf_counter()
+    ajustados = ajustar_modelos([modelos[i] for i in faltantes], y, exog)
+    # Tempo do ajuste paralelo de todos os modelos faltantes
+    tempo_ajuste = time.perf_counter() - inicio
+    for i, modelo in zip(faltantes, ajustados):
+      registrados[i] = (modelo, salvar_modelo(modelo, chaves[i], semente, tempo_ajuste))
+    limpar_registro()
+
+  for i, (modelo, metadados) in enumerate(registrados):
+    situacao = "ajustado" if i in faltantes else f"reaproveitado do registro (ajustado em {metadados['ajustado_em']})"
+    print(f"Modelo {type(modelo.regressor).__name__} [{chaves[i]}]: {situacao}")
+  return [modelo for modelo, _ in registrados], [metadados for _, metadados in registrados]
+
+# Função (cronômetro) para medir o tempo de cada etapa de uma execução: cada
+# chamada registra o tempo (segundos) desde a chamada anterior
+def cronometro():
+  ultimo = [time.perf_counter()]
+
+  def marcar(etapa):
+    agora = time.perf_counter()
+    marcar.tempos[etapa] = round(agora - ultimo[0], 3)
+    ultimo[0] = agora
+
+  marcar.tempos = {}
+  return marcar
+
+# Função para registrar uma execução: tempos de cada etapa e chaves dos modelos usados
+def registrar_execucao(tempos, metadados):
+  os.makedirs(PASTA_REGISTRO, exist_ok = True)
+  execucao = {
+    "data": datetime.now().isoformat(timespec = "seconds"),
+    "tempos": tempos,
+    "modelos": [m["chave"] for m in metadados]
+  }
+  with open(ARQUIVO_EXECUCOES, "a", encoding = "utf-8") as arquivo:
+    arquivo.write(json.dumps(execucao) + "\n")
+
+# Função para listar os modelos do registro (metadados), do mais recente ao mais antigo
+def ler_registro():
+  metadados = []
+  for caminho in glob.glob(f"{PASTA_REGISTRO}*.json"):
+    with open(caminho, encoding = "utf-8") as arquivo:
+      metadados.append(json.load(arquivo))
+  if not metadados:
+    return pd.DataFrame()
+  return pd.DataFrame(metadados).sort_values("ajustado_em", ascending = False, ignore_index = True)
+
+
+# Consulta ----
+
+if __name__ == "__main__":
+  with pd.option_context("display.width", 200, "display.max_columns", 20):
+    print(ler_registro().filter(["chave", "regressor", "inicio_treino", "fim_treino", "ajustado_em", "tempo_ajuste"]))
@@ -0,0 +1,93 @@
+# Bibliotecas ----
+
+import copy
+import warnings
+import numpy as np
+import pandas as pd
+
+
+# Parâmetros ----
+
+# Grade de valores de alpha (penalidade da Ridge) avaliados
+ALPHAS = np.logspace(-3, 3, 61)
+
+
+# Funções ----
+
+# Função para calcular o caminho de regularização da Ridge: coeficientes e erro
+# quadrático médio de leave-one-out (LOO) de cada alpha, a partir de uma única
+# SVD da matriz de regressores centrada. Com intercepto não penalizado, a matriz
+# chapéu é H = 11'/n + U diag(s²/(s²+alpha)) U' e o resíduo LOO de cada
+# observação é e_i / (1 - H_ii), sem reajustar o modelo
+def caminho_ridge(X, y, alphas = ALPHAS):
+  X = np.asarray(X, dtype = float)
+  y = np.asarray(y, dtype = float)
+  n = len(y)
+  X_c = X - X.mean(axis = 0)
+  y_c = y - y.mean()
+
+  # Descarta componentes nulos (colunas colineares) da SVD
+  U, s, Vt = np.linalg.svd(X_c, full_matrices = False)
+  nao_nulos = s > s.max() * 1e-12
+  U, s, Vt = U[:, nao_nulos], s[nao_nulos], Vt[nao_nulos]
+  Uty = U.T @ y_c
+
+  # Fatores de encolhimento (n_alphas, n_componentes)
+  alphas = np.asarray(alphas, dtype = float)
+  encolhimento = s ** 2 / (s ** 2 + alphas[:, None])
+
+  # Valores ajustados, diagonal da matriz chapéu e resíduos LOO de cada alpha
+  ajustados = y.mean() + (encolhimento * Uty) @ U.T
+  h = 1 / n + encolhimento @ (U ** 2).T
+  residuos_loo = (y - ajustados) / (1 - h)
+
+  coeficientes = (encolhimento / s * Uty) @ Vt
+  return pd.DataFrame({
+    "alpha": alphas,
+    "mse_loo": (residuos_loo ** 2).mean(axis = 1),
+    "norma_coef": np.linalg.norm(coeficientes, axis = 1)
+  })
+
+# Função para escolher o alpha de um forecaster com regressor Ridge: monta a
+# matriz de treino do forecaster (lags e regressores já transformados) e
+# retorna o alpha de menor erro LOO, com o caminho completo
+def escolher_alpha(modelo, y, exog, alphas = ALPHAS):
+  with warnings.catch_warnings():
+    warnings.simplefilter("ignore")
+    X_treino, y_treino = copy.deepcopy(modelo).create_train_X_y(y, exog)
+  caminho = caminho_ridge(X_treino, y_treino, alphas)
+  return float(caminho.alpha[caminho.mse_loo.idxmin()]), caminho
+
+
+# Benchmark ----
+
+if __name__ == "__main__":
+  import time
+  from sklearn.linear_model import Ridge, RidgeCV
+  from sklearn.model_selection import LeaveOneOut, cross_val_score
+
+  # Dados sintéticos nas dimensões do modelo de produção (≈ 260 meses, 1 lag,
+  # 4 regressores e 11 dummies)
+  aleatorio = np.random.default_rng(1984)
+  X = aleatorio.normal(size = (260, 16))
+  y = X @ aleatorio.normal(scale = 0.3, size = 16) + aleatorio.normal(size = 260)
+
+  inicio = time.perf_counter()
+  caminho = caminho_ridge(X, y)
+  tempo_svd = time.perf_counter() - inicio
+  alpha = caminho.alpha[caminho.mse_loo.idxmin()]
+
+  # Referência: LOO por força bruta (n reajustes por alpha) em uma amostra da grade
+  amostra = ALPHAS[::10]
+  inicio = time.perf_counter()
+  mse_bruto = [
+    -cross_val_score(Ridge(alpha = a), X, y, cv = LeaveOneOut(), scoring = "neg_mean_squared_error").mean()
+    for a in amostra
+  ]
+  tempo_bruto = (time.perf_counter() - inicio) * len(ALPHAS) / len(amostra)
+  diferenca = np.abs(caminho.mse_loo.to_numpy()[::10] - mse_bruto).max()
+
+  print(f"Caminho com {len(ALPHAS)} alphas por SVD: {tempo_svd * 1000:.1f} ms (alpha escolhido: {alpha:.4g})")
+  print(f"LOO por força bruta (estimado para a grade toda): {tempo_bruto:.1f} s")
+  print(f"Maior diferença no MSE LOO: {diferenca:.2e}")
+  print(f"Alpha do RidgeCV (sklearn): {RidgeCV(alphas = ALPHAS).fit(X, y).alpha_:.4g}")
@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+import pipeline
+from transporte import FalhaColeta
+from utils import juntar_tabelas, atualizar_tabela
+
+
+@pytest.fixture(autouse = True)
+def pasta_artefatos(tmp_path, monkeypatch):
+  monkeypatch.setattr(pipeline, "PASTA_ARTEFATOS", f"{tmp_path}/")
+
+
+def _serie(id, valores):
+  return pd.DataFrame({id: valores}, index = pd.date_range("2025-01-01", periods = len(valores), freq = "MS").rename("data"))
+
+def _coleta_com_falha():
+  raise FalhaColeta("circuito aberto")
+
+# Grafo com duas fontes (coleta e tratamento) e uma montagem que cruza ambas
+def _etapas(tolerar_falha):
+  return {
+    "coleta_a": dict(funcao = lambda: _serie("a", [1.0, 2.0]), tolerar_falha = tolerar_falha),
+    "coleta_b": dict(funcao = _coleta_com_falha, tolerar_falha = tolerar_falha),
+    "tratamento_a": dict(funcao = lambda df: df * 10, dependencias = ["coleta_a"]),
+    "tratamento_b": dict(funcao = lambda df: df * 10, dependencias = ["coleta_b"]),
+    "montagem": dict(
+      funcao = lambda a, b, atual: atualizar_tabela(atual, juntar_tabelas([a, b]), {}),
+      dependencias = ["tratamento_a", "tratamento_b", "atual"],
+      dependencias_opcionais = ["tratamento_a", "tratamento_b"]
+    )
+  }
+
+
+def test_falha_de_uma_fonte_mantem_colunas_armazenadas():
+  atual = _serie("a", [0.0, 0.0]).join(_serie("b", [5.0, 6.0]))
+
+  resultados = pipeline.executar_etapas(_etapas(tolerar_falha = True), externas = {"atual": atual})
+
+  assert resultados["coleta_b"] is None
+  assert resultados["tratamento_b"] is None
+  assert resultados["montagem"].a.tolist() == [10.0, 20.0]
+  assert resultados["montagem"].b.tolist() == [5.0, 6.0]
+
+
+def test_falha_nao_tolerada_interrompe_o_grafo():
+  with pytest.raises(FalhaColeta):
+    pipeline.executar_etapas(_etapas(tolerar_falha = False), externas = {"atual": _serie("a", [0.0, 0.0])})
+
+
+def test_etapa_com_falha_nao_grava_artefato():
+  etapas = _etapas(tolerar_falha = True)
+  pipeline.executar_etapas(etapas, externas = {"atual": _serie("a", [0.0, 0.0])})
+
+  # A coleta que falhou é tentada de novo na próxima execução
+  chamadas = []
+  etapas["coleta_b"]["funcao"] = lambda: chamadas.append(1) or _serie("b", [7.0, 8.0])
+  resultados = pipeline.executar_etapas(etapas, externas = {"atual": _serie("a", [0.0, 0.0])})
+
+  assert chamadas == [1]
+  assert resultados["montagem"].b.tolist() == [70.0, 80.0]
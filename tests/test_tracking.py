@@ -0,0 +1,54 @@
+import pandas as pd
+from tracking import salvar_tracking, ler_tracking
+
+
+# Previsões de um modelo feitas em um dia (em horário posterior à meia-noite)
+def _previsoes(data_previsao, tipo = "Ridge", valor = 0.4):
+  return pd.DataFrame({
+    "data_referencia": pd.date_range("2026-01-01", periods = 3, freq = "MS"),
+    "valor": valor,
+    "ic_inferior": valor - 0.2,
+    "ic_superior": valor + 0.2,
+    "variavel": "ipca",
+    "tipo": tipo,
+    "data_previsao": pd.Timestamp(data_previsao)
+  })
+
+
+def test_ler_tracking_inclui_o_dia_final(tmp_path):
+  pasta = f"{tmp_path}/"
+  salvar_tracking(pd.concat([_previsoes("2025-12-04 00:11"), _previsoes("2025-12-11 11:54")]), pasta)
+
+  df = ler_tracking(pasta, inicio = "2025-12-10", fim = "2025-12-11")
+
+  assert df.shape[0] == 3
+  assert (df.data_previsao.dt.normalize() == pd.Timestamp("2025-12-11")).all()
+
+
+def test_ler_tracking_filtra_intervalo_e_modelos(tmp_path):
+  pasta = f"{tmp_path}/"
+  salvar_tracking(
+    pd.concat([
+      _previsoes("2025-12-04 00:11"),
+      _previsoes("2025-12-11 11:54"),
+      _previsoes("2025-12-11 11:54", tipo = "Huber"),
+      _previsoes("2025-12-15 00:43")
+      ]),
+    pasta
+    )
+
+  assert ler_tracking(pasta).shape[0] == 12
+  assert ler_tracking(pasta, fim = "2025-12-04").shape[0] == 3
+  assert ler_tracking(pasta, inicio = "2025-12-05", fim = "2025-12-14").shape[0] == 6
+  assert set(ler_tracking(pasta, modelos = ["Huber"]).tipo) == {"Huber"}
+
+
+def test_salvar_tracking_mantem_ultima_execucao_do_dia(tmp_path):
+  pasta = f"{tmp_path}/"
+  salvar_tracking(_previsoes("2025-12-11 09:00", valor = 0.1), pasta)
+  salvar_tracking(_previsoes("2025-12-11 18:00", valor = 0.5), pasta)
+
+  df = ler_tracking(pasta, inicio = "2025-12-11", fim = "2025-12-11")
+
+  assert df.shape[0] == 3
+  assert (df.valor == 0.5).all()
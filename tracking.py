@@ -0,0 +1,251 @@
+# Bibliotecas ----
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import threading
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from armazenamento import ler_painel
+from utils import gravar_atomico, gravar_json
+
+
+# Parâmetros ----
+
+# Pasta do histórico de previsões: um arquivo parquet por dia de previsão (safra)
+PASTA_TRACKING = "dados/tracking/"
+
+# Arquivo CSV do formato anterior (apenas acréscimos), usado na migração
+ARQUIVO_CSV = "dados/tracking.csv"
+
+# Tabela materializada de erros de previsão (uma linha por previsão), tabela de
+# acurácia por modelo e horizonte e arquivo de controle (safras já processadas)
+ARQUIVO_ERROS = "dados/erros_previsao.parquet"
+ARQUIVO_ACURACIA = "dados/acuracia_previsao.parquet"
+ARQUIVO_CONTROLE_ERROS = "dados/erros_previsao.json"
+
+# Painel com o IPCA observado
+ARQUIVO_OBSERVADO = "dados/df_mensal.parquet"
+
+# Colunas e tipos do histórico
+ESQUEMA = pa.schema([
+  ("data_referencia", pa.timestamp("ns")),
+  ("valor", pa.float64()),
+  ("ic_inferior", pa.float64()),
+  ("ic_superior", pa.float64()),
+  ("variavel", pa.dictionary(pa.int8(), pa.string())),
+  ("tipo", pa.dictionary(pa.int8(), pa.string())),
+  ("data_previsao", pa.timestamp("ns"))
+])
+
+# Uma previsão é identificada pela safra (dia da previsão), pelo modelo e pela
+# data de referência: cada arquivo é uma safra, então a chave dentro dele é
+# (modelo, data de referência) e uma nova execução no mesmo dia substitui a anterior
+CHAVE = ["tipo", "data_referencia"]
+
+_trava = threading.Lock()
+
+
+# Funções ----
+
+# Função para padronizar colunas e tipos de um histórico de previsões
+def _tipar(df):
+  return (
+    df
+    .filter(ESQUEMA.names)
+    .astype({
+      "data_referencia": "datetime64[ns]",
+      "valor": "float64",
+      "ic_inferior": "float64",
+      "ic_superior": "float64",
+      "variavel": "string",
+      "tipo": "string",
+      "data_previsao": "datetime64[ns]"
+      })
+    .astype({"variavel": "category", "tipo": "category"})
+  )
+
+# Função para obter o arquivo da safra (dia) de uma data de previsão
+def _arquivo_safra(data, pasta = PASTA_TRACKING):
+  return f"{pasta}{pd.Timestamp(data):%Y-%m-%d}.parquet"
+
+# Função para acrescentar previsões ao histórico: cada safra é regravada de
+# forma atômica, mantendo apenas a última execução do dia de cada (tipo, data_referencia)
+def salvar_tracking(df, pasta = PASTA_TRACKING):
+  os.makedirs(pasta, exist_ok = True)
+  df = _tipar(df)
+  with _trava:
+    for dia, novas in df.groupby(df.data_previsao.dt.normalize()):
+      caminho = _arquivo_safra(dia, pasta)
+      if os.path.exists(caminho):
+        novas = pd.concat([pd.read_parquet(caminho), novas.astype({"variavel": "string", "tipo": "string"})])
+      novas = (
+        _tipar(novas)
+        .sort_values("data_previsao", kind = "stable")
+        .drop_duplicates(subset = CHAVE, keep = "last")
+        .sort_values(CHAVE)
+      )
+      tabela = pa.Table.from_pandas(novas, schema = ESQUEMA, preserve_index = False)
+      gravar_atomico(caminho, lambda temporario: pq.write_table(tabela, temporario, compression = "zstd"))
+
+# Função para ler o histórico de previsões, lendo apenas as safras do intervalo
+# de datas de previsão e as linhas dos modelos pedidos
+def ler_tracking(pasta = PASTA_TRACKING, modelos = None, inicio = None, fim = None):
+  inicio = None if inicio is None else pd.Timestamp(inicio)
+  fim = None if fim is None else pd.Timestamp(fim)
+
+  # O nome de cada arquivo é o dia da safra: descarta os que estão fora do intervalo
+  arquivos = []
+  for caminho in sorted(glob.glob(pasta + "*.parquet")):
+    dia = pd.Timestamp(os.path.basename(caminho)[:-len(".parquet")])
+    if inicio is not None and dia < inicio.normalize():
+      continue
+    if fim is not None and dia > fim.normalize():
+      continue
+    arquivos.append(caminho)
+
+  if not arquivos:
+    return _tipar(ESQUEMA.empty_table().to_pandas())
+
+  df = pq.read_table(
+    arquivos,
+    schema = ESQUEMA,
+    filters = None if modelos is None else [("tipo", "in", list(modelos))]
+    ).to_pandas()
+  if inicio is not None:
+    df = df[df.data_previsao >= inicio]
+  # O fim é inclusivo por dia: inclui as execuções ao longo de todo o dia final
+  if fim is not None:
+    df = df[df.data_previsao.dt.normalize() <= fim.normalize()]
+  return df.reset_index(drop = True)
+
+# Função para obter a assinatura (arquivos, tamanho e resumo do conteúdo) do
+# histórico; não usa a data de modificação, que um novo checkout redefine
+def assinatura_tracking(pasta = PASTA_TRACKING):
+  if not os.path.isdir(pasta):
+    return ()
+  assinatura = []
+  for entrada in os.scandir(pasta):
+    if entrada.name.endswith(".parquet"):
+      with open(entrada.path, "rb") as arquivo:
+        resumo = hashlib.sha256(arquivo.read()).hexdigest()
+      assinatura.append((entrada.name, entrada.stat().st_size, resumo))
+  return tuple(sorted(assinatura))
+
+# Função para calcular os erros das previsões de um conjunto de safras
+def _calcular_erros(df):
+  return (
+    df
+    .filter(["data_previsao", "tipo", "data_referencia", "valor"])
+    .assign(
+      tipo = lambda x: x.tipo.astype(str),
+      # Horizonte: posição da data de referência entre as previsões da safra
+      horizonte = lambda x: (
+        x.groupby(["data_previsao", "tipo"]).data_referencia.rank(method = "dense").astype("int16")
+        ),
+      observado = float("nan"),
+      erro = float("nan")
+      )
+  )
+
+# Função para calcular viés, MAE e RMSE por modelo e horizonte
+def _calcular_acuracia(erros):
+  return (
+    erros
+    .dropna(subset = ["erro"])
+    .assign(erro_absoluto = lambda x: x.erro.abs(), erro_quadratico = lambda x: x.erro ** 2)
+    .groupby(["tipo", "horizonte"], observed = True)
+    .agg(
+      n = ("erro", "size"),
+      vies = ("erro", "mean"),
+      mae = ("erro_absoluto", "mean"),
+      rmse = ("erro_quadratico", "mean")
+      )
+    .assign(rmse = lambda x: x.rmse ** 0.5)
+    .reset_index()
+  )
+
+# Função para atualizar a tabela de erros de previsão: recalcula apenas as
+# safras novas ou alteradas e as linhas cujo IPCA observado chegou ou foi revisado
+def atualizar_erros(pasta = PASTA_TRACKING, arquivo_observado = ARQUIVO_OBSERVADO):
+  try:
+    with open(ARQUIVO_CONTROLE_ERROS, encoding = "utf-8") as arquivo:
+      controle = json.load(arquivo)
+  except (OSError, ValueError):
+    controle = {}
+  if controle and os.path.exists(ARQUIVO_ERROS):
+    erros = pd.read_parquet(ARQUIVO_ERROS).assign(tipo = lambda x: x.tipo.astype(str))
+  else:
+    controle = {}
+    erros = _calcular_erros(_tipar(ESQUEMA.empty_table().to_pandas()))
+
+  # Safras novas, alteradas ou removidas desde a última atualização
+  safras = {nome: [tamanho, resumo] for nome, tamanho, resumo in assinatura_tracking(pasta)}
+  processadas = controle.get("safras", {})
+  alteradas = [nome for nome in safras if processadas.get(nome) != safras[nome]]
+  removidas = [nome for nome in processadas if nome not in safras]
+  if alteradas or removidas:
+    dias = pd.to_datetime([nome[:-len(".parquet")] for nome in alteradas + removidas])
+    erros = pd.concat(
+      [erros[~erros.data_previsao.dt.normalize().isin(dias)]] +
+      [_calcular_erros(pd.read_parquet(pasta + nome)) for nome in alteradas]
+      ).reset_index(drop = True)
+
+  # Linhas cujo IPCA observado mudou (novas observações, revisões ou safras novas)
+  observado = ler_painel(
+    arquivo_observado,
+    colunas = ["ipca"],
+    inicio = erros.data_referencia.min() if erros.shape[0] else None
+    ).ipca.dropna()
+  observado_atual = erros.data_referencia.map(observado)
+  mudou = ~((observado_atual == erros.observado) | (observado_atual.isna() & erros.observado.isna()))
+
+  if not (alteradas or removidas or mudou.any()):
+    return False
+
+  erros.loc[mudou, "observado"] = observado_atual[mudou]
+  erros.loc[mudou, "erro"] = erros.observado[mudou] - erros.valor[mudou]
+  erros = (
+    erros
+    .sort_values(["data_previsao", "tipo", "data_referencia"])
+    .astype({"tipo": "category"})
+    .reset_index(drop = True)
+  )
+
+  # Grava as tabelas e, por último, o controle (uma falha no meio refaz tudo)
+  for df, caminho in [(erros, ARQUIVO_ERROS), (_calcular_acuracia(erros), ARQUIVO_ACURACIA)]:
+    gravar_atomico(caminho, lambda temporario: df.to_parquet(temporario, index = False, compression = "zstd"))
+  gravar_json(ARQUIVO_CONTROLE_ERROS, {"safras": safras}, indent = 2)
+  return True
+
+# Função para ler a tabela de erros de previsão (uma linha por previsão)
+def ler_erros(modelos = None):
+  return pd.read_parquet(
+    ARQUIVO_ERROS,
+    filters = None if modelos is None else [("tipo", "in", list(modelos))]
+    )
+
+# Função para ler a acurácia (viés, MAE e RMSE) por modelo e horizonte
+def ler_acuracia():
+  return pd.read_parquet(ARQUIVO_ACURACIA)
+
+# Função para migrar o histórico do CSV anterior para o formato em parquet
+def migrar_tracking_csv(arquivo_csv = ARQUIVO_CSV, pasta = PASTA_TRACKING):
+  df = pd.read_csv(arquivo_csv, dtype = {"variavel": "string", "tipo": "string"})
+  salvar_tracking(df, pasta)
+  return df.shape[0]
+
+
+# Migração manual ----
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description = "Histórico de previsões (tracking)")
+  parser.add_argument("--migrar", nargs = "?", const = ARQUIVO_CSV, help = "migra o CSV anterior para o formato em parquet")
+  argumentos = parser.parse_args()
+  if argumentos.migrar:
+    print(f"{migrar_tracking_csv(argumentos.migrar)} linhas migradas de {argumentos.migrar}")
+  atualizar_erros()
+  print(ler_acuracia())
@@ -0,0 +1,200 @@
+# Bibliotecas ----
+
+import gzip
+import http.client
+import random
+import threading
+import time
+from urllib.parse import urlsplit, urljoin
+
+
+# Parâmetros ----
+
+# Conexões simultâneas (e mantidas abertas) por host
+MAX_CONEXOES_POR_HOST = {
+  "api.bcb.gov.br": 6,
+  "olinda.bcb.gov.br": 2,
+  "apisidra.ibge.gov.br": 2,
+  "www.ipeadata.gov.br": 2,
+  "fred.stlouisfed.org": 4
+}
+MAX_CONEXOES_PADRAO = 4
+
+# Prazo total (em segundos) de cada fonte, contado a partir da primeira requisição
+PRAZO_POR_HOST = {
+  "api.bcb.gov.br": 20 * 60,
+  "olinda.bcb.gov.br": 20 * 60,
+  "apisidra.ibge.gov.br": 10 * 60,
+  "www.ipeadata.gov.br": 10 * 60,
+  "fred.stlouisfed.org": 10 * 60
+}
+PRAZO_PADRAO = 10 * 60
+
+# Falhas consecutivas que abrem o circuito de um host e tempo (em segundos)
+# até uma nova tentativa ser permitida
+LIMITE_FALHAS = 5
+TEMPO_CIRCUITO_ABERTO = 120
+
+# Espera base e máxima (em segundos) do backoff exponencial
+ESPERA_BASE = 1
+ESPERA_MAXIMA = 30
+
+# Tempo máximo de espera por resposta (segundos)
+TIMEOUT = 120
+
+# Status HTTP que indicam falha temporária
+STATUS_TEMPORARIOS = {408, 425, 429, 500, 502, 503, 504}
+
+_trava = threading.Lock()
+_conexoes_livres = {}
+_semaforos = {}
+_circuitos = {}
+_inicio_host = {}
+
+
+# Exceções ----
+
+class FalhaColeta(Exception):
+  pass
+
+class ErroHTTP(FalhaColeta):
+  def __init__(self, url, status):
+    super().__init__(f"HTTP {status} em {url}")
+    self.status = status
+    self.temporario = status in STATUS_TEMPORARIOS
+
+class CircuitoAberto(FalhaColeta):
+  pass
+
+class PrazoEsgotado(FalhaColeta):
+  pass
+
+
+# Funções ----
+
+# Função para calcular a espera antes de uma nova tentativa (backoff
+# exponencial com jitter completo)
+def espera_backoff(tentativa):
+  return random.uniform(0, min(ESPERA_MAXIMA, ESPERA_BASE * 2 ** tentativa))
+
+# Função para indicar se vale a pena tentar de novo após um erro
+def erro_temporario(erro):
+  if isinstance(erro, (CircuitoAberto, PrazoEsgotado)):
+    return False
+  if isinstance(erro, ErroHTTP):
+    return erro.temporario
+  return True
+
+# Função para retornar o tempo restante do prazo de um host
+def prazo_restante(host):
+  with _trava:
+    inicio = _inicio_host.setdefault(host, time.monotonic())
+  return PRAZO_POR_HOST.get(host, PRAZO_PADRAO) - (time.monotonic() - inicio)
+
+# Função para verificar o circuito de um host antes de uma requisição
+def _verificar_circuito(host):
+  with _trava:
+    circuito = _circuitos.setdefault(host, {"falhas": 0, "aberto_ate": 0})
+    agora = time.monotonic()
+    if circuito["falhas"] >= LIMITE_FALHAS:
+      if agora < circuito["aberto_ate"]:
+        raise CircuitoAberto(f"Fonte {host} indisponível; novas tentativas suspensas")
+      # Meio-aberto: libera uma tentativa e bloqueia as demais até o resultado
+      circuito["aberto_ate"] = agora + TEMPO_CIRCUITO_ABERTO
+
+# Função para registrar o resultado de uma requisição no circuito do host
+def _registrar_resultado(host, sucesso):
+  with _trava:
+    circuito = _circuitos.setdefault(host, {"falhas": 0, "aberto_ate": 0})
+    if sucesso:
+      circuito["falhas"] = 0
+    else:
+      circuito["falhas"] += 1
+      if circuito["falhas"] >= LIMITE_FALHAS:
+        circuito["aberto_ate"] = time.monotonic() + TEMPO_CIRCUITO_ABERTO
+
+# Função para obter o semáforo de conexões de um host
+def _semaforo(host):
+  with _trava:
+    if host not in _semaforos:
+      _semaforos[host] = threading.BoundedSemaphore(MAX_CONEXOES_POR_HOST.get(host, MAX_CONEXOES_PADRAO))
+    return _semaforos[host]
+
+# Função para obter uma conexão do pool do host (reaproveitada, se houver)
+def _obter_conexao(esquema, host):
+  chave = (esquema, host)
+  with _trava:
+    livres = _conexoes_livres.setdefault(chave, [])
+    if livres:
+      return livres.pop(), True
+  classe = http.client.HTTPSConnection if esquema == "https" else http.client.HTTPConnection
+  return classe(host, timeout = TIMEOUT), False
+
+# Função para devolver uma conexão ao pool do host
+def _devolver_conexao(esquema, host, conexao):
+  with _trava:
+    _conexoes_livres.setdefault((esquema, host), []).append(conexao)
+
+# Função para executar uma única requisição GET numa conexão do pool
+def _executar(url, cabecalhos):
+  partes = urlsplit(url)
+  caminho = partes.path or "/"
+  if partes.query:
+    caminho = f"{caminho}?{partes.query}"
+
+  # Conexões reaproveitadas podem ter sido fechadas pelo servidor; nesse caso,
+  # repete imediatamente com uma conexão nova
+  while True:
+    conexao, reaproveitada = _obter_conexao(partes.scheme, partes.netloc)
+    try:
+      conexao.request("GET", caminho, headers = cabecalhos)
+      resposta = conexao.getresponse()
+      conteudo = resposta.read()
+    except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+      conexao.close()
+      if reaproveitada:
+        continue
+      raise
+    except Exception:
+      conexao.close()
+      raise
+    if resposta.will_close:
+      conexao.close()
+    else:
+      _devolver_conexao(partes.scheme, partes.netloc, conexao)
+    return resposta, conteudo
+
+# Função para fazer uma requisição GET pelo transporte compartilhado
+def requisitar(url, cabecalhos = None, max_redirecionamentos = 5):
+  cabecalhos = {
+    "User-Agent": "imersao03-etl",
+    "Accept-Encoding": "gzip",
+    **(cabecalhos or {})
+    }
+
+  for _ in range(max_redirecionamentos + 1):
+    host = urlsplit(url).netloc
+    if prazo_restante(host) <= 0:
+      raise PrazoEsgotado(f"Prazo da fonte {host} esgotado")
+    _verificar_circuito(host)
+
+    with _semaforo(host):
+      try:
+        resposta, conteudo = _executar(url, cabecalhos)
+      except Exception:
+        _registrar_resultado(host, sucesso = False)
+        raise
+
+    # O host respondeu; apenas erros temporários contam como falha do circuito
+    _registrar_resultado(host, sucesso = resposta.status not in STATUS_TEMPORARIOS)
+
+    if resposta.status in (301, 302, 303, 307, 308) and resposta.getheader("Location"):
+      url = urljoin(url, resposta.getheader("Location"))
+      continue
+    if resposta.status >= 400:
+      raise ErroHTTP(url, resposta.status)
+    if resposta.getheader("Content-Encoding", "").lower() == "gzip":
+      conteudo = gzip.decompress(conteudo)
+    return resposta.status, resposta.headers, conteudo
+
+  raise FalhaColeta(f"Redirecionamentos demais em {url}")
@@ -1,90 +1,262 @@
 # Bibliotecas ----
 
+import json
+import os
+import re
+import threading
 import time
 import pandas as pd
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, quote
+# cache_http também usa as funções de gravação daqui: importa o módulo, e não
+# os nomes, para que a ordem de importação dos dois não importe
+import cache_http
+from transporte import espera_backoff, erro_temporario, prazo_restante, ErroHTTP, FalhaColeta
+
+
+# Parâmetros ----
+
+# Máximo de coletas simultâneas por fonte (limita a carga sobre cada host)
+MAX_COLETAS_POR_FONTE = {
+  "BCB/SGS": 4,
+  "BCB/ODATA": 2,
+  "IBGE/SIDRA": 2,
+  "IPEADATA": 2,
+  "FRED": 4
+}
+
+# Janela de revisão (em meses) reprocessada a cada execução incremental
+JANELA_REVISAO = 6
+
+# Janelas de consulta de séries diárias do BCB/SGS: tamanho inicial (anos),
+# menor tamanho antes de desistir de subdividir (dias) e número de linhas a
+# partir do qual a resposta é tratada como truncada
+ANOS_JANELA_SGS = 10
+DIAS_JANELA_MINIMA_SGS = 31
+LIMITE_LINHAS_SGS = 20000
+
+# Tipos das colunas lidas das expectativas do BCB/ODATA (demais são texto)
+TIPOS_COLUNAS_ODATA = {
+  "Media": "float64",
+  "Mediana": "float64"
+}
 
 
 # Funções ----
 
-# Função de coleta JSON com retentativas
-def ler_json_com_retentativa(url):
+# Função genérica de coleta com retentativas (backoff exponencial com jitter)
+def ler_com_retentativa(url, leitor, *ars, **kwargs):
   max_retentativas = 5
   tentativa = 1
-  while tentativa <= max_retentativas:
+  host = urlsplit(url).netloc
+  forcar = False
+  while True:
     try:
-      df = pd.read_json(url)
+      df = cache_http.obter_tabela(url, leitor, *ars, forcar = forcar, **kwargs)
       return df
     except Exception as e:
-      tentativa =+ 1
       print(f"Falha na coleta de dados: {e}")
-      time.sleep(2)
-  print(f"Falha após {max_retentativas} tentativas")
+      # Resposta ilegível: a próxima tentativa ignora o cache e baixa de novo
+      forcar = isinstance(e, cache_http.ErroLeitura)
+      espera = espera_backoff(tentativa)
+      # Erros definitivos, circuito aberto ou prazo da fonte esgotado encerram as tentativas
+      if tentativa >= max_retentativas or not erro_temporario(e) or espera >= prazo_restante(host):
+        print(f"Falha após {tentativa} tentativas")
+        raise
+      tentativa += 1
+      time.sleep(espera)
+
+# Função de coleta JSON com retentativas
+def ler_json_com_retentativa(url):
+  return ler_com_retentativa(url, pd.read_json)
 
 # Função de coleta CSV com retentativas
 def ler_csv_com_retentativa(*ars, **kwargs):
-  max_retentativas = 5
-  tentativa = 1
-  while tentativa <= max_retentativas:
-    try:
-      df = pd.read_csv(*ars, **kwargs)
-      return df
-    except Exception as e:
-      tentativa =+ 1
-      print(f"Falha na coleta de dados: {e}")
-      time.sleep(2)
-  print(f"Falha após {max_retentativas} tentativas")
+  if ars:
+    url, *ars = ars
+  else:
+    url = kwargs.pop("filepath_or_buffer")
+  return ler_com_retentativa(url, pd.read_csv, *ars, **kwargs)
+
+# Função para executar coletas simultaneamente, com uma fila por fonte
+def coletar_em_paralelo(tarefas):
+  # Cada tarefa é uma tupla (fonte, função de coleta, argumentos nomeados);
+  # fontes distintas avançam em paralelo, de modo que o tempo total é ditado
+  # pela fonte mais lenta, e não pelo número de séries
+  executores = {}
+  futuros = []
+  for fonte, funcao, argumentos in tarefas:
+    if fonte not in executores:
+      executores[fonte] = ThreadPoolExecutor(
+        max_workers = MAX_COLETAS_POR_FONTE.get(fonte, 1),
+        thread_name_prefix = fonte
+        )
+    futuros.append(executores[fonte].submit(funcao, **argumentos))
+  try:
+    # Resultados na mesma ordem das tarefas
+    return [futuro.result() for futuro in futuros]
+  finally:
+    for executor in executores.values():
+      executor.shutdown(wait = False, cancel_futures = True)
+
+# Função para calcular a data de corte e a data de início da coleta incremental
+def calcular_janela_incremental(ultima_data, janela_revisao = JANELA_REVISAO):
+  # Observações a partir do corte são substituídas pelas recém-coletadas
+  data_corte = (
+    (pd.Timestamp(ultima_data) - pd.DateOffset(months = janela_revisao))
+    .to_period("M")
+    .to_timestamp()
+  )
+  # A coleta começa no início do ano anterior ao corte, para que agregações
+  # mensais, trimestrais e por horizonte de expectativa fiquem completas
+  data_inicio = pd.Timestamp(year = data_corte.year - 1, month = 1, day = 1)
+  return data_corte, data_inicio
+
+# Função para atualizar uma tabela armazenada com observações novas (upsert)
+def atualizar_tabela(df_atual, df_novo, datas_corte):
+  df = df_atual.reindex(
+    index = df_atual.index.union(df_novo.index),
+    columns = df_atual.columns.union(df_novo.columns, sort = False)
+    )
+  for col in df_novo.columns:
+    serie = df_novo[col].dropna()
+    if col in datas_corte:
+      serie = serie[serie.index >= datas_corte[col]]
+    df.loc[serie.index, col] = serie
+  return df.rename_axis(df_novo.index.name).sort_index()
+
+# Função para cruzar tabelas pelas datas (outer join), ignorando as ausentes (None)
+def juntar_tabelas(tabelas):
+  tabelas = [df for df in tabelas if df is not None]
+  if not tabelas:
+    return pd.DataFrame(index = pd.DatetimeIndex([], name = "data"))
+  df = tabelas[0]
+  for outra in tabelas[1:]:
+    df = df.join(outra, how = "outer")
+  return df.sort_index()
+
+# Função para adicionar uma condição ao parâmetro $filter de uma URL OData
+def adicionar_filtro_odata(url, condicao):
+  partes = urlsplit(url)
+  parametros = parse_qsl(partes.query, keep_blank_values = True)
+  if any(chave == "$filter" for chave, _ in parametros):
+    parametros = [
+      (chave, f"{valor} and {condicao}" if chave == "$filter" else valor)
+      for chave, valor in parametros
+    ]
+  else:
+    parametros.append(("$filter", condicao))
+  query = urlencode(parametros, quote_via = quote, safe = "$'(),/:")
+  return urlunsplit(partes._replace(query = query))
+
+# Função para definir as colunas retornadas ($select) por uma URL OData
+def definir_selecao_odata(url, colunas):
+  partes = urlsplit(url)
+  parametros = [
+    (chave, valor)
+    for chave, valor in parse_qsl(partes.query, keep_blank_values = True)
+    if chave != "$select"
+  ]
+  parametros.append(("$select", ",".join(colunas)))
+  query = urlencode(parametros, quote_via = quote, safe = "$'(),/:")
+  return urlunsplit(partes._replace(query = query))
+
+# Função para ler CSV em blocos, com tipos de coluna definidos de antemão
+def ler_csv_em_blocos(arquivo, tamanho_bloco = 100_000, **kwargs):
+  with pd.read_csv(arquivo, chunksize = tamanho_bloco, **kwargs) as blocos:
+    return pd.concat(blocos, ignore_index = True)
 
 # Função para calcular intervalos de datas
-def criar_intervalo_datas(data_inicio: datetime):
+def criar_intervalo_datas(data_inicio: datetime, anos: int = ANOS_JANELA_SGS):
     intervalos_data = []
     data_inicio_corrente = data_inicio
 
     while data_inicio_corrente < datetime.now():
-        end_date = data_inicio_corrente + relativedelta(years=5) - relativedelta(days=1)
+        end_date = data_inicio_corrente + relativedelta(years=anos) - relativedelta(days=1)
         intervalos_data.append((data_inicio_corrente, end_date))
         data_inicio_corrente = end_date + relativedelta(days=1)
 
     return intervalos_data
 
+# Função de coleta de uma janela de datas do BCB/SGS, subdividida se a API
+# recusar o tamanho da janela ou devolver uma resposta possivelmente truncada
+def coleta_janela_bcb_sgs(codigo, inicio, fim):
+  url = f"https://api.bcb.gov.br/dados/serie/bcdata.sgs.{codigo}/dados?formato=json&dataInicial={inicio.strftime('%d/%m/%Y')}&dataFinal={fim.strftime('%d/%m/%Y')}"
+  try:
+    df = ler_json_com_retentativa(url)
+    if len(df) < LIMITE_LINHAS_SGS:
+      return df
+  except ErroHTTP as e:
+    # Janela sem observações
+    if e.status == 404:
+      return pd.DataFrame()
+    if e.temporario:
+      raise
+  if (fim - inicio).days <= DIAS_JANELA_MINIMA_SGS:
+    raise FalhaColeta(f"Não foi possível coletar a série {codigo} entre {inicio:%d/%m/%Y} e {fim:%d/%m/%Y}")
+  meio = inicio + relativedelta(days = (fim - inicio).days // 2)
+  return pd.concat([
+    coleta_janela_bcb_sgs(codigo, inicio, meio),
+    coleta_janela_bcb_sgs(codigo, meio + relativedelta(days = 1), fim)
+  ])
+
 # Função de coleta de dados do BCB/SGS
 def coleta_bcb_sgs(codigo, id, data_inicio, freq):
 
-  urls = []
+  print(f"Coletando a série {codigo} do BCB/SGS...")
   if freq == "Diária":
+    # Séries diárias são consultadas em janelas, uma de cada vez: o paralelismo
+    # fica entre as séries, limitado por MAX_COLETAS_POR_FONTE; cada janela
+    # tem suas próprias retentativas
     data_inicio = pd.to_datetime(data_inicio, format = "%d/%m/%Y").to_pydatetime()
     intervalos_data = criar_intervalo_datas(data_inicio)
-    for intervalo in intervalos_data:
-      url = f"https://api.bcb.gov.br/dados/serie/bcdata.sgs.{codigo}/dados?formato=json&dataInicial={intervalo[0].strftime('%d/%m/%Y')}&dataFinal={intervalo[1].strftime('%d/%m/%Y')}"
-      urls.append(url)
+    dfs = [coleta_janela_bcb_sgs(codigo, *intervalo) for intervalo in intervalos_data]
   else:
     url = f"https://api.bcb.gov.br/dados/serie/bcdata.sgs.{codigo}/dados?formato=json&dataInicial={data_inicio}"
-    urls.append(url)
+    dfs = [ler_json_com_retentativa(url)]
 
-  print(f"Coletando a série {codigo} do BCB/SGS...")
-  dfs = []
-  for url in urls:
-    dfs.append(ler_json_com_retentativa(url))
+  # Janelas sem observações (comum no modo incremental)
+  dfs = [df for df in dfs if not df.empty]
+  if not dfs:
+    return pd.DataFrame(columns = [id], index = pd.DatetimeIndex([], name = "data"), dtype = float)
 
   df = (
       pd.concat(dfs)
+      .drop_duplicates(subset = "data", keep = "last")
       .assign(data = lambda x: pd.to_datetime(x.data, format = "%d/%m/%Y"))
       .set_index("data")
+      .sort_index()
       .rename(columns = {"valor": id})
       )
   return df
 
 # Função de coleta de dados do BCB/ODATA
-def coleta_bcb_odata(url, id):
+def coleta_bcb_odata(url, id, data_inicio = None, colunas = None):
   print(f"Coletando a série {id} do BCB/ODATA...")
-  df = ler_csv_com_retentativa(url, decimal = ",")
+  if colunas is None:
+    colunas = ["Data", "DataReferencia", "Media"]
+  # Filtro de data e seleção de colunas são aplicados pelo próprio serviço
+  url = definir_selecao_odata(url, colunas)
+  if data_inicio is not None:
+    url = adicionar_filtro_odata(url, f"Data ge '{data_inicio.strftime('%Y-%m-%d')}'")
+  df = ler_com_retentativa(
+    url,
+    ler_csv_em_blocos,
+    usecols = colunas,
+    dtype = {coluna: TIPOS_COLUNAS_ODATA.get(coluna, "string") for coluna in colunas},
+    decimal = ","
+    )
   return(df)
 
 # Função de coleta de dados do IBGE/SIDRA
-def coleta_ibge_sidra(url, id):
+def coleta_ibge_sidra(url, id, data_inicio = None):
   print(f"Coletando a série {id} do IBGE/SIDRA...")
+  if data_inicio is not None:
+    periodo = f"/p/{data_inicio.strftime('%Y%m')}-{datetime.now().strftime('%Y%m')}"
+    url = re.sub(r"/p/all(?=/|$)", periodo, url)
   df = (
       ler_json_com_retentativa(f"{url}?formato=json")
       .query("V not in ['Valor', '...', '-']")
@@ -98,9 +270,12 @@ def coleta_ibge_sidra(url, id):
   return(df)
 
 # Função de coleta de dados do IPEADATA
-def coleta_ipeadata(codigo, id):
+def coleta_ipeadata(codigo, id, data_inicio = None):
   print(f"Coletando a série {id} do IPEADATA...")
-  df = ler_json_com_retentativa(f"http://www.ipeadata.gov.br/api/odata4/ValoresSerie(SERCODIGO='{codigo}')")
+  url = f"http://www.ipeadata.gov.br/api/odata4/ValoresSerie(SERCODIGO='{codigo}')"
+  if data_inicio is not None:
+    url = adicionar_filtro_odata(url, f"VALDATA ge {data_inicio.strftime('%Y-%m-%d')}T00:00:00-03:00")
+  df = ler_json_com_retentativa(url)
   df = (
       pd.DataFrame.from_records(df.value)
       .assign(
@@ -113,10 +288,13 @@ def coleta_ipeadata(codigo, id):
   return(df)
 
 # Função de coleta de dados do FRED
-def coleta_fred(codigo, id):
+def coleta_fred(codigo, id, data_inicio = None):
   print(f"Coletando a série {id} do FRED...")
+  url = f"https://fred.stlouisfed.org/graph/fredgraph.csv?id={codigo}"
+  if data_inicio is not None:
+    url = f"{url}&cosd={data_inicio.strftime('%Y-%m-%d')}"
   df = (
-      ler_csv_com_retentativa(f"https://fred.stlouisfed.org/graph/fredgraph.csv?id={codigo}")
+      ler_csv_com_retentativa(url)
       .assign(
           data = lambda x: pd.to_datetime(x["observation_date"]),
           **{id: lambda x: x[codigo].astype(float)}
@@ -126,6 +304,43 @@ def coleta_fred(codigo, id):
     )
   return(df)
 
+# Função para converter datas em texto, convertendo cada valor distinto uma
+# única vez (as mesmas datas se repetem milhares de vezes nas expectativas)
+def converter_datas(serie, formato):
+  codigos, valores = pd.factorize(serie)
+  convertidos = pd.to_datetime(valores, format = formato)
+  return pd.DatetimeIndex(np.where(codigos >= 0, convertidos.values[codigos], np.datetime64("NaT")))
+
+# Função para tratar expectativas do Focus conforme especificações declarativas
+def tratar_expectativas(dfs, especificacoes):
+  # Cada especificação define: id (coluna de saída), formato de DataReferencia,
+  # período de agregação de Data ("periodo"), horizonte alvo e sua unidade,
+  # base do horizonte (Data "bruta" ou "agregada") e chave de agrupamento
+  tratados = []
+  for espec in especificacoes:
+    df = dfs[espec["id"]]
+    data = converter_datas(df["Data"], "%Y-%m-%d")
+    data_agregada = data if espec.get("periodo") is None else data.to_period(espec["periodo"]).to_timestamp()
+
+    filtro = np.ones(len(df), dtype = bool)
+    if espec.get("referencia") is not None:
+      referencia = converter_datas(df["DataReferencia"], espec["referencia"])
+    if espec.get("horizonte") is not None:
+      base = data_agregada if espec.get("base") == "agregada" else data
+      horizonte = np.trunc((referencia - base) / pd.Timedelta(espec["unidade"]))
+      filtro = horizonte == espec["horizonte"]
+
+    chave = referencia if espec.get("agrupar_por") == "DataReferencia" else data_agregada
+    tratados.append(
+      pd.Series(df["Media"].to_numpy()[filtro], index = chave[filtro])
+      .groupby(level = 0)
+      .mean()
+      .sort_index()
+      .rename_axis("data")
+      .to_frame(espec["id"])
+    )
+  return tratados[0].join(tratados[1:], how = "outer").sort_index()
+
 # Função para transformar dados, conforme definido nos metadados
 def transformar(x, tipo):
 
@@ -141,4 +356,131 @@ def transformar(x, tipo):
   if tipo not in switch:
       raise ValueError("Tipo inválido")
 
-  return switch[tipo](x)
\ No newline at end of file
+  return switch[tipo](x)
+
+# Função para gravar um arquivo de forma atômica: `gravar` recebe um caminho
+# temporário (único por processo e thread), que depois substitui o arquivo, de
+# modo que leitores nunca veem um arquivo pela metade
+def gravar_atomico(caminho, gravar):
+  temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+  try:
+    gravar(temporario)
+    os.replace(temporario, caminho)
+  except BaseException:
+    if os.path.exists(temporario):
+      os.remove(temporario)
+    raise
+
+# Função para gravar bytes em um arquivo de forma atômica
+def gravar_bytes(caminho, conteudo):
+  def gravar(temporario):
+    with open(temporario, "wb") as arquivo:
+      arquivo.write(conteudo)
+  gravar_atomico(caminho, gravar)
+
+# Função para gravar um objeto em json de forma atômica (argumentos de json.dump)
+def gravar_json(caminho, dados, **kwargs):
+  def gravar(temporario):
+    with open(temporario, "w", encoding = "utf-8") as arquivo:
+      json.dump(dados, arquivo, **kwargs)
+  gravar_atomico(caminho, gravar)
+
+# Função para descartar as entradas de um cache usadas há mais tempo (LRU),
+# acima de um limite. Cada entrada é uma lista de arquivos; a data de
+# modificação do primeiro marca o último uso. O limite vale para o número de
+# entradas ou, com `por_tamanho`, para a soma dos tamanhos (bytes). Arquivos
+# removidos ao mesmo tempo por outro processo são ignorados
+def limpar_lru(entradas, limite, por_tamanho = False):
+  usos = []
+  for arquivos in entradas:
+    try:
+      uso = os.path.getmtime(arquivos[0])
+      tamanho = sum(os.path.getsize(a) for a in arquivos if os.path.exists(a)) if por_tamanho else 1
+    except OSError:
+      continue
+    usos.append((uso, tamanho, arquivos))
+
+  total = 0
+  for _, tamanho, arquivos in sorted(usos, key = lambda x: x[0], reverse = True):
+    total += tamanho
+    if total <= limite:
+      continue
+    for arquivo in arquivos:
+      try:
+        os.remove(arquivo)
+      except OSError:
+        pass
+
+# Função para medir o tempo médio (milissegundos) de uma função sem argumentos
+def medir(funcao, repeticoes = 20):
+  inicio = time.perf_counter()
+  for _ in range(repeticoes):
+    funcao()
+  return (time.perf_counter() - inicio) / repeticoes * 1000
+
+
+# Benchmark ----
+
+if __name__ == "__main__":
+  import http.server
+  import tempfile
+
+  # Servidores locais no lugar de cada fonte: latência (segundos) por resposta
+  # e número de séries coletadas de cada uma
+  fontes = {
+    "BCB/SGS": (0.3, 16),
+    "BCB/ODATA": (0.6, 4),
+    "IBGE/SIDRA": (0.5, 6),
+    "IPEADATA": (0.4, 4),
+    "FRED": (0.2, 8)
+  }
+  cache_http.PASTA_CACHE = tempfile.mkdtemp() + "/"
+
+  # Função para criar um servidor que responde JSON após a latência da fonte
+  def servidor(latencia):
+    class Resposta(http.server.BaseHTTPRequestHandler):
+      def do_GET(self):
+        time.sleep(latencia)
+        corpo = f'[{{"data": "01/01/2024", "valor": "{self.path[1:]}"}}]'.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+      def log_message(self, *args):
+        pass
+
+    instancia = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Resposta)
+    threading.Thread(target = instancia.serve_forever, daemon = True).start()
+    return f"http://127.0.0.1:{instancia.server_port}"
+
+  enderecos = {fonte: servidor(latencia) for fonte, (latencia, _) in fontes.items()}
+
+  # Função para montar as tarefas de coleta (URLs distintas a cada rodada, sem cache)
+  def tarefas(rodada):
+    return [
+      (fonte, ler_json_com_retentativa, {"url": f"{enderecos[fonte]}/{rodada}-{serie}"})
+      for fonte, (_, series) in fontes.items()
+      for serie in range(series)
+    ]
+
+  inicio = time.perf_counter()
+  for fonte, funcao, argumentos in tarefas("sequencial"):
+    funcao(**argumentos)
+  sequencial = time.perf_counter() - inicio
+
+  inicio = time.perf_counter()
+  resultados = coletar_em_paralelo(tarefas("paralelo"))
+  paralelo = time.perf_counter() - inicio
+
+  # Tempo esperado: a fonte mais lenta, com suas coletas simultâneas
+  esperado = {
+    fonte: latencia * -(-series // MAX_COLETAS_POR_FONTE.get(fonte, 1))
+    for fonte, (latencia, series) in fontes.items()
+  }
+  mais_lenta = max(esperado, key = esperado.get)
+  print(f"{len(resultados)} séries de {len(fontes)} fontes (latências simuladas)")
+  print(f"  sequencial: {sequencial:.2f} s")
+  print(f"  paralelo:   {paralelo:.2f} s")
+  print(f"  fonte mais lenta ({mais_lenta}): {esperado[mais_lenta]:.2f} s")
@@ -0,0 +1,198 @@
+# Bibliotecas ----
+import json
+from types import MappingProxyType
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from armazenamento import ler_painel
+from acumulacao import acumular_12m
+from tracking import ler_erros
+from inicializacao import ARQUIVOS_DADOS, ARQUIVO_INICIALIZACAO, resumo_dados
+from utils import gravar_json
+
+
+# Parâmetros ----
+
+# Colunas obrigatórias das previsões
+colunas_previsao = ["data_referencia", "valor", "ic_inferior", "ic_superior", "variavel", "tipo"]
+
+
+# Dados ----
+
+# Função para validar os dados lidos antes de exibi-los
+def validar_snapshot(df_previsao, df_ipca):
+    faltantes = set(colunas_previsao) - set(df_previsao.columns)
+    if faltantes:
+        raise ValueError(f"Colunas ausentes nas previsões: {sorted(faltantes)}")
+    if df_previsao.query("variavel == 'IPCA'").empty:
+        raise ValueError("Nenhuma previsão do IPCA")
+    if df_previsao.valor.isna().any():
+        raise ValueError("Previsões com valores ausentes")
+    if df_ipca.query("tipo == 'Observado'").empty:
+        raise ValueError("Nenhuma observação do IPCA")
+
+# Função para carregar e validar uma versão (snapshot) imutável dos dados
+def carregar_snapshot(versao, arquivos = ARQUIVOS_DADOS):
+    df_previsao = pd.read_parquet(arquivos[0])
+    df_ipca = pd.concat([
+        (
+            ler_painel(arquivos[1], colunas = ["ipca"])
+            .dropna()
+            .reset_index()
+            .rename(columns = {"ipca": "valor", "data": "data_referencia", "index": "data_referencia"})
+            .assign(variavel = "IPCA", tipo = "Observado")
+        ),
+        df_previsao
+    ])
+    validar_snapshot(df_previsao, df_ipca)
+    return MappingProxyType({
+        "versao": versao,
+        "df_previsao": df_previsao,
+        "df_ipca": df_ipca,
+        "modelos": df_previsao.query("variavel == 'IPCA'")["tipo"].unique().tolist()
+    })
+
+
+# Visões por modelo ----
+
+# Função para montar, uma única vez, os dados prontos para exibição de um modelo
+def montar_visoes(df_ipca, modelo_selecionado):
+
+    # Histórico recente e previsões do modelo, com datas já formatadas
+    df_fanchart = (
+        df_ipca
+        .query("tipo in [@modelo_selecionado, 'Observado']")
+        .tail(12*15)
+        .assign(
+            valor_yoy = lambda x: acumular_12m(x.valor)
+            )
+    )
+    previsao = df_fanchart.query("tipo == @modelo_selecionado")
+    observado = df_fanchart.query("tipo == 'Observado'")
+    primeira_previsao = previsao.loc[previsao.data_referencia == previsao.data_referencia.min()].iloc[0]
+    ultimo_observado = observado.loc[observado.data_referencia == observado.data_referencia.max()].iloc[0]
+
+    # Tabela de previsões
+    df_fantable = (
+        previsao
+        .filter(["data_referencia", "ic_inferior", "valor", "ic_superior"])
+        .assign(data_referencia = lambda x: x.data_referencia.dt.strftime("%m/%Y"))
+        .rename(
+            columns = {
+                "data_referencia": "Período",
+                "ic_inferior": "I.C. Inferior",
+                "valor": "Previsão",
+                "ic_superior": "I.C. Superior"
+            }
+        )
+        .round(2)
+    )
+
+    return MappingProxyType({
+        "fanchart": (
+            df_fanchart
+            .drop(labels = "valor_yoy", axis = "columns")
+            .assign(
+                tipo = lambda x: x["tipo"].replace({"Observado": "IPCA"}),
+                data_referencia = lambda x: x["data_referencia"].dt.strftime("%Y-%m-%d")
+                )
+        ),
+        "fantable": df_fantable,
+        "previsao_ano_corrente": (primeira_previsao.data_referencia.year, round(primeira_previsao.valor_yoy, 2)),
+        "previsao_mensal": (primeira_previsao.data_referencia.strftime("%m/%Y"), round(primeira_previsao.valor, 2)),
+        "ultimo_valor_mensal": (ultimo_observado.data_referencia.strftime("%m/%Y"), round(ultimo_observado.valor, 2))
+    })
+
+# Função para montar o gráfico de leque (fanchart) de um modelo
+def montar_fanchart(df_fanchart):
+    fig = px.line(
+        data_frame = df_fanchart,
+        x = "data_referencia",
+        y = "valor",
+        color = "tipo",
+        title = "Previsão do IPCA",
+        labels = {"data_referencia": "Data", "valor": "Valor", "tipo": "Série"},
+        hover_data = {"data_referencia": True, "valor": ':.2f', "tipo": True}
+    )
+
+    # Intervalo de confiança apenas nas previsões: o histórico observado não tem
+    # intervalo e só aumentaria a figura serializada
+    df_ic = df_fanchart.query("tipo != 'IPCA'").sort_values("data_referencia")
+    fig.add_trace(
+        go.Scatter(
+            x = df_ic["data_referencia"],
+            y = df_ic["ic_superior"],
+            mode = 'lines',
+            line = dict(width=0),
+            showlegend = False,
+            hoverinfo = 'skip'
+        )
+    )
+    fig.add_trace(
+        go.Scatter(
+            x = df_ic["data_referencia"],
+            y = df_ic["ic_inferior"],
+            mode = 'lines',
+            line = dict(width=0),
+            fill = 'tonexty',
+            fillcolor = 'rgba(30,144,255,0.18)',
+            showlegend = False,
+            hoverinfo = 'skip'
+        )
+    )
+
+    return fig
+
+# Função para montar a tabela de tracking de um modelo a partir da tabela
+# materializada de erros (já unida ao IPCA observado)
+def montar_tabela_tracking(modelo):
+    return (
+        ler_erros(modelos = [modelo])
+        .assign(
+            tipo = lambda x: x.tipo.astype(str),
+            data_referencia = lambda x: x.data_referencia.dt.strftime("%m/%Y"),
+            data_previsao = lambda x: x.data_previsao.astype(str)
+            )
+        .filter(["data_referencia", "valor", "tipo", "data_previsao", "observado", "erro"])
+        .rename(
+            columns = {
+                "data_referencia": "Data Referência",
+                "valor": "Previsão",
+                "tipo": "Modelo",
+                "data_previsao": "Data de Previsão",
+                "observado": "Observado",
+                "erro": "Erro de Previsão"
+            }
+        )
+        .round(2)
+    )
+
+
+# Artefato de inicialização ----
+
+# Função para gerar o artefato de inicialização do dashboard: modelos, cards,
+# tabela de previsões e figura serializada de cada modelo
+def salvar_inicializacao(arquivos = ARQUIVOS_DADOS, caminho = ARQUIVO_INICIALIZACAO):
+    resumo = resumo_dados(arquivos)
+    snapshot = carregar_snapshot(resumo, arquivos)
+    artefato = {"resumo": resumo, "modelos": snapshot["modelos"], "visoes": {}}
+    for modelo in snapshot["modelos"]:
+        visoes = montar_visoes(snapshot["df_ipca"], modelo)
+        artefato["visoes"][modelo] = {
+            "fantable": json.loads(visoes["fantable"].to_json(orient = "split", index = False)),
+            "previsao_ano_corrente": [int(visoes["previsao_ano_corrente"][0]), float(visoes["previsao_ano_corrente"][1])],
+            "previsao_mensal": [visoes["previsao_mensal"][0], float(visoes["previsao_mensal"][1])],
+            "ultimo_valor_mensal": [visoes["ultimo_valor_mensal"][0], float(visoes["ultimo_valor_mensal"][1])],
+            "figura": montar_fanchart(visoes["fanchart"]).to_json()
+        }
+    gravar_json(caminho, artefato, ensure_ascii = False)
+
+# Função para obter as visões de um modelo a partir do artefato de inicialização
+def visoes_do_artefato(artefato, modelo):
+    visoes = artefato["visoes"][modelo]
+    return MappingProxyType({
+        "fantable": pd.DataFrame(visoes["fantable"]["data"], columns = visoes["fantable"]["columns"]),
+        "previsao_ano_corrente": tuple(visoes["previsao_ano_corrente"]),
+        "previsao_mensal": tuple(visoes["previsao_mensal"]),
+        "ultimo_valor_mensal": tuple(visoes["ultimo_valor_mensal"])
+    })